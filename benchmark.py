@@ -0,0 +1,149 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_sros_server import add_behaviour_arguments, behaviour_from_options, start_server
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "network_ssh_command_execution.v3.5.py")
+
+
+def load_script():
+    """Import the v3.5 script as the ssh_tool module (its file name is not a valid module name).
+
+    The module is registered in sys.modules so that shard processes can unpickle its functions.
+    """
+    spec = importlib.util.spec_from_file_location("ssh_tool", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+if __name__ == "__mp_main__":
+    # Shard processes started by spawn or forkserver import this file, not the script
+    load_script()
+
+
+def device_addresses(count):
+    """Loopback addresses served by the mock server: 127.0.0.1 .. 127.0.x.y."""
+    return [f"127.0.{index // 250}.{index % 250 + 1}" for index in range(count)]
+
+
+def max_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    if sys.platform == "win32":
+        return 0.0  # No resource module
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_benchmark(tool, engine, ip_addresses, commands, concurrency, port, path="engine", extra_args=()):
+    """Run one engine against the mock fleet and return (elapsed seconds, peak traced MB, results).
+
+    path "engine" calls run_engine (execute_commands per device), "job" goes through run_job
+    like main() and the headless mode do, with an inventory file and the job manifest.
+    """
+    args = tool.parse_args(
+        ["--engine", engine, "--concurrency", str(concurrency), "--port", str(port), "--fixed-concurrency",
+         "--no-timing-profiles", *extra_args]
+    )
+    if path == "job":
+        with open(args.inventory, "w") as file:
+            file.write("\n".join(ip_addresses) + "\n")
+        with open(args.commands, "w") as file:
+            file.write("\n".join(commands) + "\n")
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if path == "job":
+            results = tool.run_job(args, "admin", "admin")
+        else:
+            results = tool.run_engine(ip_addresses, commands, "admin", "admin", args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return elapsed, peak, results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the execution engines against a local mock SR-OS fleet.",
+        usage="%(prog)s [options] [-- tool options]",
+    )
+    parser.add_argument(
+        "--devices", type=int, nargs="+", default=[10, 100, 1000], help="Fleet sizes to run (default: 10 100 1000)"
+    )
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock per-command latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--engines", nargs="+", default=["threads", "asyncio"])
+    parser.add_argument("--path", choices=("engine", "job"), default="engine", help="Entry point exercised (default: engine)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the measurements to this JSON file")
+    add_behaviour_arguments(parser)
+    # Options of the tool itself follow a -- separator, e.g. -- --batch --retries 0
+    argv = sys.argv[1:]
+    extra_args = []
+    if "--" in argv:
+        extra_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    options = parser.parse_args(argv)
+    json_file = os.path.abspath(options.json) if options.json else None
+
+    tool = load_script()
+    server = start_server(options.port, behaviour=behaviour_from_options(options))
+    commands = ["show bof", "show version"]
+
+    print(
+        f"{len(commands)} commands, {options.latency}s latency per command, {options.output_size} bytes per output, "
+        f"seed {options.seed}"
+    )
+    measurements = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs("Outputs", exist_ok=True)
+        os.makedirs("LOGs", exist_ok=True)
+        for count in options.devices:
+            ip_addresses = device_addresses(count)
+            for engine in options.engines:
+                elapsed, peak, results = run_benchmark(
+                    tool, engine, ip_addresses, commands, options.concurrency, options.port, options.path, extra_args
+                )
+                done = sum(1 for result in results if result["status"] == "done")
+                reasons = {}
+                for result in results:
+                    if result["status"] != "done":
+                        reasons[result["reason"]] = reasons.get(result["reason"], 0) + 1
+                measurements.append({
+                    "devices": count,
+                    "engine": engine,
+                    "concurrency": options.concurrency,
+                    "done": done,
+                    "failed": reasons,
+                    "seconds": round(elapsed, 3),
+                    "devices_per_second": round(len(results) / elapsed, 2),
+                    "peak_traced_mb": round(peak, 1),
+                    "max_rss_mb": round(max_rss_mb(), 1),
+                })
+                print(
+                    f"{count:>5} devices  {engine:<8} concurrency={options.concurrency:<4} {done}/{len(results)} ok  "
+                    f"{elapsed:8.2f}s  {len(results) / elapsed:7.2f} devices/s  "
+                    f"peak {peak:7.1f} MB traced, {max_rss_mb():7.1f} MB RSS"
+                    + (f"  failed: {reasons}" if reasons else "")
+                )
+    server.close()
+    if json_file:
+        with open(json_file, "w") as file:
+            json.dump(measurements, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import logging
+import random
+import socket
+import threading
+import time
+
+import paramiko
+
+# Canned outputs returned by the mock router, anything else gets a generic line
+CANNED_OUTPUTS = {
+    "show bof": (
+        "===============================================================================\n"
+        "BOF (Memory)\n"
+        "===============================================================================\n"
+        "    primary-image    cf3:\\timos\\TiMOS-C-20.10.R5\\cpm.tim\n"
+        "    primary-config   cf3:\\config.cfg\n"
+        "==============================================================================="
+    ),
+    "environment no more": "",
+}
+
+
+class MockBehaviour:
+    """Latency, output size and failure rates of the mock fleet.
+
+    Whether a login fails is drawn from seed, router address and the number of logins of
+    that router so far, so a run against the same fleet fails the same sessions whatever
+    the order in which the clients connect. Faults: "auth" rejects the password, "drop"
+    closes the shell as soon as it opens, "hang" never answers the first command.
+    """
+
+    def __init__(self, latency=0.0, output_size=0, auth_failure_rate=0.0, drop_rate=0.0, hang_rate=0.0, seed=0):
+        self.latency = latency
+        self.output_size = output_size
+        self.rates = (("auth", auth_failure_rate), ("drop", drop_rate), ("hang", hang_rate))
+        self.seed = seed
+        self.logins = {}
+        self.lock = threading.Lock()
+
+    def fault(self, address):
+        """Fault of the next login to the router at address, None for a healthy session."""
+        with self.lock:
+            self.logins[address] = self.logins.get(address, 0) + 1
+            roll = random.Random(f"{self.seed}:{address}:{self.logins[address]}").random()
+        for fault, rate in self.rates:
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+
+class MockSROSServer(paramiko.ServerInterface):
+    """Accept password logins (unless the behaviour fails them), shells and direct-tcpip channels."""
+
+    def __init__(self, behaviour, address):
+        self.behaviour = behaviour
+        self.address = address
+        self.fault = None
+        self.shells = {}
+        self.forwards = {}
+
+    def check_auth_password(self, username, password):
+        self.fault = self.behaviour.fault(self.address)
+        if self.fault == "auth":
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            self.shells[chanid] = threading.Event()
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_FAILED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.forwards[chanid] = socket.create_connection(destination, timeout=10)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shells[channel.get_id()].set()
+        return True
+
+
+def hostname_for(local_ip):
+    """Derive a router name from the loopback address the client connected to (127.0.0.5 -> R5)."""
+    return f"R{local_ip.rsplit('.', 1)[-1]}"
+
+
+def filler(size):
+    """About size bytes of route-table-like lines padding a command output."""
+    lines = []
+    total = 0
+    index = 0
+    while total < size:
+        line = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}/32     Remote  BGP       00h12m34s  170"
+        lines.append(line)
+        total += len(line) + 1
+        index += 1
+    return "\n".join(lines)
+
+
+def command_output(command, output_size=0):
+    """Return the canned output for a command, padded to output_size bytes if requested."""
+    if command.startswith("echo "):
+        return command[5:].strip().strip('"')  # Batch sentinels must come back unchanged
+    if command in CANNED_OUTPUTS:
+        output = CANNED_OUTPUTS[command]
+        if not output:
+            return output
+    else:
+        output = f"MINOR: CLI Command not supported by mock router: {command}"
+    if output_size > len(output):
+        output += "\n" + filler(output_size - len(output))
+    return output
+
+
+def run_shell(channel, prompt, behaviour, fault=None):
+    """Emulate the SR-OS classic CLI: echo input, answer each line, print the prompt."""
+    if fault == "drop":
+        return
+    channel.sendall(f"\r\n{prompt} ")
+    line = ""
+    while True:
+        data = channel.recv(1024)
+        if not data:
+            return
+        for char in data.decode(errors="ignore"):
+            if char in "\r\n":
+                channel.sendall("\r\n")
+                command = line.strip()
+                line = ""
+                if command in ("logout", "exit all"):
+                    return
+                if command:
+                    if fault == "hang" and command != "environment no more":
+                        # Keep the channel open without ever answering, until the client gives up
+                        while channel.recv(1024):
+                            pass
+                        return
+                    if behaviour.latency:
+                        time.sleep(behaviour.latency)
+                    output = command_output(command, behaviour.output_size)
+                    if output:
+                        channel.sendall(output.replace("\n", "\r\n") + "\r\n")
+                channel.sendall(f"{prompt} ")
+            else:
+                line += char
+                channel.sendall(char)
+
+
+def forward(channel, sock):
+    """Relay a direct-tcpip channel to its TCP connection until either side closes."""
+
+    def pump(read, write):
+        try:
+            while True:
+                data = read(65536)
+                if not data:
+                    break
+                write(data)
+        except (EOFError, OSError):
+            pass
+        with contextlib.suppress(EOFError, OSError, paramiko.SSHException):
+            channel.close()
+        sock.close()
+
+    threading.Thread(target=pump, args=(sock.recv, channel.sendall), daemon=True).start()
+    pump(channel.recv, sock.sendall)
+
+
+def handle_client(client, host_key, behaviour):
+    """Run the SSH server side of one client connection: any number of shells and forwards.
+
+    The connection is closed once its last shell has ended, like a router logging out.
+    """
+    transport = paramiko.Transport(client)
+    transport.add_server_key(host_key)
+    server = MockSROSServer(behaviour, client.getsockname()[0])
+    prompt = f"A:{hostname_for(client.getsockname()[0])}#"
+    shells = [0]
+    lock = threading.Lock()
+
+    def shell(channel, requested):
+        with contextlib.suppress(EOFError, OSError, paramiko.SSHException):
+            if requested.wait(10):
+                run_shell(channel, prompt, behaviour, server.fault)
+        # The client may have closed the transport already
+        with contextlib.suppress(EOFError, OSError, paramiko.SSHException):
+            channel.close()
+        with lock:
+            shells[0] -= 1
+            if not shells[0]:
+                transport.close()
+
+    try:
+        transport.start_server(server=server)
+        while transport.is_active():
+            channel = transport.accept(20)
+            if channel is None:
+                continue
+            if channel.get_id() in server.forwards:
+                threading.Thread(
+                    target=forward, args=(channel, server.forwards.pop(channel.get_id())), daemon=True
+                ).start()
+                continue
+            with lock:
+                shells[0] += 1
+            threading.Thread(target=shell, args=(channel, server.shells[channel.get_id()]), daemon=True).start()
+    except (EOFError, OSError, paramiko.SSHException):
+        transport.close()
+
+
+def start_server(port=2222, latency=0.0, bind="0.0.0.0", behaviour=None):
+    """Start the mock server in a background thread and return the listening socket.
+
+    behaviour (a MockBehaviour) replaces latency when output sizes or failures are wanted.
+    """
+    behaviour = behaviour or MockBehaviour(latency)
+    # Port probes and aborted clients make paramiko log banner errors, keep the console clean
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((bind, port))
+    sock.listen(1024)
+
+    def accept_loop():
+        while True:
+            try:
+                client, _ = sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=handle_client, args=(client, host_key, behaviour), daemon=True
+            ).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return sock
+
+
+def add_behaviour_arguments(parser):
+    """Options shaping the mock fleet, shared with benchmark.py."""
+    parser.add_argument("--output-size", type=int, default=0, help="Pad every command output to this many bytes")
+    parser.add_argument("--auth-failure-rate", type=float, default=0.0, help="Fraction of logins rejected")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of sessions closed once logged in")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of sessions never answering a command")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the failure draws (default: 0)")
+
+
+def behaviour_from_options(options):
+    return MockBehaviour(
+        options.latency,
+        options.output_size,
+        options.auth_failure_rate,
+        options.drop_rate,
+        options.hang_rate,
+        options.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Nokia SR-OS SSH server for offline testing.")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering a command")
+    add_behaviour_arguments(parser)
+    options = parser.parse_args()
+    start_server(options.port, behaviour=behaviour_from_options(options))
+    print(f"Mock SR-OS server listening on port {options.port}, connect to 127.0.0.x to reach router Rx")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -1,25 +1,88 @@
 import encodings.idna
+import argparse
+import asyncio
+import codecs
+import contextlib
+import copy
+import csv
+import difflib
+import multiprocessing
+import queue
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import io
 import os
+import random
 import re
+import secrets
+import socket
+import sqlite3
 import sys
+import tarfile
+import threading
 import time
-import logging
+import json
 import ipaddress
-from colorama import init, Fore, Style
-from concurrent.futures import ThreadPoolExecutor
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from getpass import getpass
-from netmiko import (
-    ConnectHandler,
-    NetMikoTimeoutException,
-    NetMikoAuthenticationException,
-)
-from paramiko.ssh_exception import SSHException
-from tqdm import tqdm
+from multiprocessing.connection import Client, Listener
 import subprocess
 
-# Initialize colorama with autoreset enabled
-init(autoreset=True)
+# SR-OS prompt at the end of a buffer, e.g. "A:R1# " or "*A:R1>config# "
+PROMPT_PATTERN = re.compile(r"[\w\-.:*@()\[\]>/]+[#>$]\s*$")
+
+# Shared secret between the daemon and its clients, only readable by the owner
+DAEMON_KEY_FILE = os.path.join("Cache", "daemon.key")
+
+# Options sent with each job to the daemon, which otherwise runs with its own startup args;
+# the paths among them are made absolute as the daemon may run from another directory
+DAEMON_JOB_OPTIONS = (
+    "output_dir", "stream", "compress", "writer", "bundle", "fsync", "batch", "channels", "batch_sentinel",
+    "store", "parse_templates", "archive", "probe", "probe_cache",
+)
+DAEMON_JOB_PATHS = ("output_dir", "bundle", "store", "parse_templates", "archive", "probe_cache")
+
+# Exit codes of the headless mode
+EXIT_OK = 0
+EXIT_DEVICE_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_ALL_FAILED = 3
+EXIT_ERROR = 4
+EXIT_INTERRUPTED = 130
+
+
+class LazyColor:
+    """Stand-in for colorama's Fore / Style importing colorama on first use.
+
+    Keeps colorama off the startup path and prints plain text when colors are disabled
+    (headless runs whose output is not a terminal).
+    """
+
+    enabled = True
+    initialized = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        if not LazyColor.enabled:
+            return ""
+        import colorama
+
+        if not LazyColor.initialized:
+            # Initialize colorama with autoreset enabled
+            colorama.init(autoreset=True)
+            LazyColor.initialized = True
+        return getattr(getattr(colorama, self.name), attribute)
+
+
+Fore = LazyColor("Fore")
+Style = LazyColor("Style")
 
 
 def clear_screen():
@@ -46,8 +109,10 @@ def open_file(filename):
         print(f"Error opening file {filename}: {e}")
 
 
-def main_menu():
+def main_menu(args=None):
     """Display the main menu and handle user choices."""
+    if args is None:
+        args = parse_args([])
     while True:
         clear_screen()
         print("=" * 50)
@@ -62,34 +127,59 @@ def main_menu():
         choice = input(f"{Fore.YELLOW}Enter your choice: {Style.RESET_ALL}")
         if choice.lower() == "i":
             clear_screen()
-            ensure_file_exists("IPAddressList.txt")
-            open_file("IPAddressList.txt")
+            ensure_file_exists(args.inventory)
+            open_file(args.inventory)
         elif choice.lower() == "c":
             clear_screen()
-            ensure_file_exists("commands.txt")
-            open_file("commands.txt")
+            ensure_file_exists(args.commands)
+            open_file(args.commands)
         elif choice.lower() == "r":
             clear_screen()
-            main()
+            main(args)
         elif choice.lower() == "e":
             print(Fore.YELLOW + "Exiting the program. Goodbye!" + Style.RESET_ALL)
             time.sleep(2)
-            sys.exit(0)
+            return
         else:
             print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
             input(Fore.MAGENTA + "Press Enter to continue..." + Style.RESET_ALL)
 
 
-def get_credentials():
-    """Prompt user for SSH credentials."""
-    username = input("Enter your username: ")
-    password = getpass("Enter your password: ")
+def get_credentials(args=None, reference=None):
+    """Prompt user for SSH credentials, unless the environment or keyring provides them."""
+    if args is not None:
+        credentials = credentials_from_environment(args, reference)
+        if credentials is not None:
+            return credentials
+    label = f" for '{reference}'" if reference else ""
+    username = input(f"Enter your username{label}: ")
+    password = getpass(f"Enter your password{label}: ")
+    return username, password
+
+
+def credentials_from_environment(args, reference=None):
+    """Return (username, password) from --username / NDCE_USERNAME and NDCE_PASSWORD or the keyring.
+
+    A credentials reference of the inventory (e.g. "core") reads NDCE_CORE_USERNAME and
+    NDCE_CORE_PASSWORD instead. Returns None when no username or password can be found
+    without prompting.
+    """
+    prefix = "NDCE_" + (re.sub(r"\W", "_", reference).upper() + "_" if reference else "")
+    username = (None if reference else args.username) or os.environ.get(prefix + "USERNAME")
+    if not username:
+        return None
+    password = os.environ.get(prefix + "PASSWORD")
+    if password is None and args.keyring_service:
+        import keyring
+
+        password = keyring.get_password(args.keyring_service, username)
+    if password is None:
+        return None
     return username, password
 
 
-def check_files_exist():
+def check_files_exist(files=("IPAddressList.txt", "commands.txt")):
     """Check if required files exist."""
-    files = ["IPAddressList.txt", "commands.txt"]
     for file_name in files:
         if not os.path.isfile(file_name):
             print(f"File '{file_name}' not found.")
@@ -97,6 +187,421 @@ def check_files_exist():
     return True
 
 
+def parse_args(argv=None):
+    """Parse the command line options."""
+    parser = argparse.ArgumentParser(description="Execute commands on network devices via SSH.")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run one job without menu or prompts (for cron / pipelines) and exit with a status code",
+    )
+    parser.add_argument(
+        "--inventory",
+        default="IPAddressList.txt",
+        metavar="FILE",
+        help="File with the device IP addresses, or a .yaml / .csv multi-vendor inventory (default: IPAddressList.txt)",
+    )
+    parser.add_argument(
+        "--commands",
+        default="commands.txt",
+        metavar="FILE",
+        help="File with the commands to execute (default: commands.txt)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="Outputs",
+        metavar="DIR",
+        help="Directory receiving one output file per device (default: Outputs)",
+    )
+    parser.add_argument(
+        "--username",
+        help="SSH username (default: $NDCE_USERNAME); the password is read from $NDCE_PASSWORD or the keyring",
+    )
+    parser.add_argument(
+        "--keyring-service",
+        metavar="NAME",
+        help="Keyring service holding the password of --username (requires the keyring package)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("threads", "asyncio"),
+        default="threads",
+        help="Execution engine: netmiko in a thread pool or asyncssh sessions (default: threads)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of devices handled at the same time (default: 8)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the inventory over this many worker processes, each with its own pool (default: 1)",
+    )
+    parser.add_argument(
+        "--initial-concurrency",
+        type=int,
+        default=8,
+        help="Concurrency the adaptive scheduler starts from (default: 8)",
+    )
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="Always run --concurrency devices at once instead of adapting to latency and timeouts",
+    )
+    parser.add_argument("--port", type=int, default=22, help="SSH port of the devices (default: 22)")
+    parser.add_argument(
+        "--jump-host",
+        metavar="[USER@]HOST[:PORT]",
+        help="Reach every device through this bastion, multiplexing one direct-tcpip channel per device over "
+        "--jump-transports SSH connections (credentials: NDCE_JUMP_USERNAME / NDCE_JUMP_PASSWORD, else the "
+        "device ones); disables the pre-flight sweep",
+    )
+    parser.add_argument(
+        "--jump-transports",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of SSH connections opened to the jump host (default: 1)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        metavar="N",
+        help="Maximum retries of a device failing with a timeout, read timeout or SSH error, with jittered "
+        "exponential backoff; authentication failures are never retried (default: 3, 0 disables)",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=3,
+        metavar="N",
+        help="Failures in a row after which a host whose retries are spent has its circuit opened, so the "
+        "daemon skips it in later jobs for --breaker-cooldown seconds (default: 3)",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=300,
+        metavar="SECONDS",
+        help="Seconds an open circuit skips its host in later daemon jobs (default: 300)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run as a daemon keeping authenticated sessions open between jobs",
+    )
+    parser.add_argument(
+        "--use-daemon",
+        action="store_true",
+        help="Send the job to the running daemon instead of connecting from this process",
+    )
+    parser.add_argument(
+        "--daemon-address",
+        default="127.0.0.1:50022",
+        help="host:port the daemon listens on (default: 127.0.0.1:50022)",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=int,
+        default=600,
+        help="Seconds a pooled session may stay idle before the daemon closes it (default: 600)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write command output to disk chunk by chunk as it arrives instead of buffering it",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=("none", "gzip", "zstd"),
+        default="none",
+        help="Compress the Outputs files (default: none)",
+    )
+    parser.add_argument(
+        "--writer",
+        action="store_true",
+        help="Hand the outputs to a background writer thread coalescing them into large buffered writes",
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Write all the outputs of a run into one Outputs/run_<time>.tar file (implies --writer)",
+    )
+    parser.add_argument(
+        "--fsync",
+        choices=("none", "file", "run"),
+        default="none",
+        help="With --writer: sync each output file to disk once written, all of them at the end of the run, "
+        "or leave it to the OS (default: none)",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Send all commands of an SR-OS device in one write, separated by sentinel echoes",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Spread the commands of an SR-OS device over N shells of its SSH connection, for read-only show "
+        "commands; outputs keep the commands.txt order (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-sentinel",
+        default='echo "{marker}"',
+        help="Command printing the {marker} text between batched commands (default: 'echo \"{marker}\"')",
+    )
+    parser.add_argument(
+        "--no-preflight",
+        dest="preflight",
+        action="store_false",
+        help="Skip the TCP reachability sweep run before connecting to the devices",
+    )
+    parser.add_argument(
+        "--preflight-timeout",
+        type=float,
+        default=3,
+        help="Seconds to wait for the SSH port during the pre-flight sweep (default: 3)",
+    )
+    parser.add_argument(
+        "--preflight-concurrency",
+        type=int,
+        default=512,
+        help="Maximum simultaneous probes during the pre-flight sweep (default: 512)",
+    )
+    parser.add_argument(
+        "--timing-profiles",
+        default=os.path.join("Cache", "timing_profiles.json"),
+        metavar="FILE",
+        help="Cache of per-device/per-command timing learned from past runs (default: Cache/timing_profiles.json)",
+    )
+    parser.add_argument(
+        "--no-timing-profiles",
+        dest="timing_profiles",
+        action="store_const",
+        const=None,
+        help="Use the fixed delay factor 2 and read timeout 90s for every device",
+    )
+    parser.add_argument(
+        "--inventory-order",
+        dest="longest_first",
+        action="store_false",
+        help="Start the devices in address order (the loaded inventory is sorted and deduplicated) instead of "
+        "longest expected run first (from the timing profiles)",
+    )
+    parser.add_argument(
+        "--job-file",
+        default=os.path.join("Jobs", "last_job.json"),
+        metavar="FILE",
+        help="Manifest recording the state of each device of the job (default: Jobs/last_job.json)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only run the devices still pending or failed in --job-file, with the commands it recorded",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="FILE",
+        help="Also write every output to this SQLite result store (e.g. Results/results.db)",
+    )
+    parser.add_argument(
+        "--parse-templates",
+        metavar="DIR",
+        help="TextFSM templates named after the commands (show_bof.textfsm) used to fill parsed_<command> "
+        "tables of --store, on top of ntc-templates",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="?",
+        const="Archive",
+        metavar="DIR",
+        help="Store outputs in a deduplicated archive (default: Archive) instead of one file per device "
+        "and print what changed since the previous archived run",
+    )
+    parser.add_argument(
+        "--archive-diff",
+        nargs="*",
+        metavar="RUN",
+        help="Compare two archived runs (default: the last two) and exit",
+    )
+    parser.add_argument(
+        "--archive-export",
+        metavar="RUN",
+        help="Write an archived run back to --output-dir as one text file per device and exit",
+    )
+    parser.add_argument(
+        "--probe",
+        metavar="COMMAND",
+        help="Cheap command run first on each device (e.g. 'show system information | match \"Last Saved\"'); "
+        "commands.txt only runs where its output changed since the last collection",
+    )
+    parser.add_argument(
+        "--probe-cache",
+        default=os.path.join("Cache", "probe_cache.json"),
+        metavar="FILE",
+        help="Probe outputs of the last collection (default: Cache/probe_cache.json)",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Headless runs only: no terminal output at all (exit code, LOGs and reports carry the outcome)",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Record per-device / per-command phase timings, export them as JSON and CSV and print a summary",
+    )
+    parser.add_argument(
+        "--report-dir",
+        default="Reports",
+        metavar="DIR",
+        help="Directory receiving the timing reports (default: Reports)",
+    )
+    parser.add_argument(
+        "--show-errors",
+        type=int,
+        nargs="?",
+        const=20,
+        metavar="N",
+        help="Print the latest N errors from LOGs/error_log.jsonl, newest first, and exit (default N: 20)",
+    )
+    args = parser.parse_args(argv)
+    for option in ("concurrency", "initial_concurrency", "shards", "channels", "jump_transports", "preflight_concurrency"):
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1")
+    if args.compress == "zstd" and importlib.util.find_spec("zstandard") is None:
+        parser.error("--compress zstd requires the zstandard package (pip install zstandard)")
+    if args.batch and args.stream:
+        parser.error("--batch and --stream cannot be combined")
+    if args.channels > 1 and (args.batch or args.stream):
+        parser.error("--channels cannot be combined with --batch or --stream")
+    if args.bundle and args.stream:
+        parser.error("--bundle keeps each output in memory until the device is done, it cannot be combined with --stream")
+    if args.bundle and args.compress == "zstd":
+        parser.error("--bundle can only be compressed with --compress gzip")
+    if args.fsync != "none" and not (args.writer or args.bundle):
+        parser.error("--fsync requires --writer or --bundle")
+    if args.jump_host:
+        try:
+            parse_jump_host(args.jump_host)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.quiet and not args.headless:
+        parser.error("--quiet requires --headless")
+    if args.archive and args.stream:
+        parser.error("--archive hashes each output in memory, it cannot be combined with --stream")
+    if args.archive_diff is not None and len(args.archive_diff) not in (0, 2):
+        parser.error("--archive-diff takes no run or two runs")
+    if args.store and args.stream:
+        parser.error("--store keeps each output in memory until it is stored, it cannot be combined with --stream")
+    if "{marker}" not in args.batch_sentinel:
+        parser.error("--batch-sentinel must contain {marker}")
+    return args
+
+
+class ProgressRenderer:
+    """Single consumer of the status events of the workers, drawing one aggregate view.
+
+    Workers only put small (kind, ip, message) tuples on a SimpleQueue, without any
+    terminal I/O or shared lock; one thread drains it, prints the per-device lines and
+    redraws the summary line a few times per second, so rendering costs the same at any
+    concurrency. Without a running renderer (daemon clients, direct calls) the lines are
+    printed at once, and inside shard processes the events go to the parent instead.
+    """
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.events = queue.SimpleQueue()
+        self.forward = None
+        self.quiet = False
+        self.thread = None
+
+    def emit(self, kind, ip_address, message=""):
+        if self.forward is not None:
+            self.forward.put(("event", kind, ip_address, message))
+        elif self.thread is not None:
+            self.events.put((kind, ip_address, message))
+        elif message and not self.quiet:
+            print(message)
+
+    def start(self, total, quiet=False):
+        self.quiet = quiet
+        if self.forward is not None or self.thread is not None:
+            return
+        self.total = total
+        self.done = self.failed = self.commands = 0
+        self.in_flight = set()
+        self.started = time.monotonic()
+        self.live = sys.stdout.isatty() and not quiet
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.events.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.live:
+            print()
+
+    def run(self):
+        while True:
+            deadline = time.monotonic() + self.interval
+            lines = []
+            try:
+                while True:
+                    event = self.events.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if event is None:
+                        self.draw(lines)
+                        return
+                    self.count(*event, lines)
+            except queue.Empty:
+                pass
+            self.draw(lines)
+
+    def count(self, kind, ip_address, message, lines):
+        if kind == "start":
+            self.in_flight.add(ip_address)
+        elif kind == "command":
+            self.commands += 1
+        elif kind == "retry":
+            self.failed -= 1  # The failed attempt goes back to the queue, the device is not failed yet
+        else:
+            self.in_flight.discard(ip_address)
+            if kind == "done":
+                self.done += 1
+            else:
+                self.failed += 1
+        if message:
+            lines.append(message)
+
+    def draw(self, lines):
+        if self.quiet:
+            return
+        if lines:
+            sys.stdout.write(("\r\033[K" if self.live else "") + "\n".join(lines) + "\n")
+        if self.live:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            sys.stdout.write(
+                "\r\033[K"
+                + Fore.LIGHTYELLOW_EX
+                + f"[PROGRESS] {self.done + self.failed}/{self.total} devices, {self.failed} failed, "
+                f"{len(self.in_flight)} in flight, {self.commands / elapsed:.1f} cmd/s"
+                + Style.RESET_ALL
+            )
+        sys.stdout.flush()
+
+
+progress = ProgressRenderer()
+
+
 def is_valid_ip(ip):
     """Check if the given string is a valid IP address."""
     try:
@@ -106,160 +611,2817 @@ def is_valid_ip(ip):
         return False
 
 
-def execute_commands(ip_address, commands, username, password):
-    """Execute commands on a given device via SSH."""
+def report_failure(ip_address, reason, error_msg, timer=None, start=None):
+    """Print and log a device failure and return its result record, with the phases timed until it failed."""
+    progress.emit("failed", ip_address, Fore.LIGHTRED_EX + "[ERROR]" + error_msg)
+    log_error(error_msg, ip=ip_address, reason=reason)
+    result = {"ip": ip_address, "status": "failed", "reason": reason, "error": error_msg}
+    if timer is not None:
+        result["elapsed"] = time.monotonic() - start
+        result["timings"] = timer.as_dict()
+    return result
+
+
+def get_hostname(prompt_hostname, ip_address, device_type="nokia_sros"):
+    """Extract the hostname from a prompt: A:R1 or *A:R1 on SR-OS, user@R1 on Junos, R1 on IOS/NX-OS/EOS."""
+    if device_type.endswith("_sros"):
+        host_name = re.split(":", prompt_hostname)
+        if len(host_name) > 1:
+            return host_name[1]
+        return ip_address  # Fallback to IP address if the prompt does not contain the expected format
+    # Drop the user@ prefix (Junos) and a configuration mode suffix such as R1(config-if)
+    host_name = re.sub(r"\(.*\)$", "", prompt_hostname.strip().split("@")[-1])
+    return host_name or ip_address
+
+
+def open_output(filename, compress):
+    """Open an Outputs file for writing text, compressed on the fly if requested."""
+    if compress == "gzip":
+        return gzip.open(filename + ".gz", "wt"), filename + ".gz"
+    if compress == "zstd":
+        import zstandard
+
+        raw = open(filename + ".zst", "wb")
+        writer = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding="utf-8"), filename + ".zst"
+    return open(filename, "w"), filename
+
+
+class OutputWriteError(Exception):
+    """An Outputs file handed to the OutputWriter could not be written."""
+
+
+class QueuedFile:
+    """File-like handle of an Outputs file whose writes are done by an OutputWriter thread."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.written = threading.Event()
+        self.error = None
+
+    def wait(self):
+        """Block until the writer has written the whole file, raise OutputWriteError if it failed."""
+        self.written.wait()
+        if self.error is not None:
+            raise OutputWriteError(self.error)
+
+    def write(self, text):
+        if text:
+            self.writer.records.put(("write", self, text))
+
+    def close(self):
+        self.writer.records.put(("close", self, None))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OutputWriter:
+    """Background thread doing the Outputs file I/O of every worker.
+
+    Workers write to a QueuedFile, which only puts records on a bounded queue (a full
+    queue slows the workers down instead of growing memory). The writer thread buffers
+    each file and writes it in blocks of buffer_size, usually the whole device output in
+    one open and one write. With bundle, every file of the run is a member of a single
+    tar archive instead. fsync "file" syncs each file once written, "run" syncs them all
+    when the writer closes, "none" leaves it to the operating system. When a file cannot
+    be written its remaining records are dropped and its handle's wait() raises, so the
+    device is reported as failed.
+    """
+
+    def __init__(self, output_dir, compress="none", fsync="none", bundle=False, buffer_size=1 << 20, max_queued=4096):
+        self.output_dir = output_dir
+        self.compress = compress
+        self.fsync = fsync
+        self.buffer_size = buffer_size
+        self.records = queue.Queue(max_queued)
+        self.files = {}
+        self.written = []
+        self.tar = None
+        self.bundle = self.create_bundle() if bundle else None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def create_bundle(self):
+        """Create the run's tar file, suffixed if another process or job took the name this second."""
+        stem = os.path.join(self.output_dir, f"run_{time.strftime('%Y-%m-%d_%H-%M-%S')}")
+        extension = ".tar.gz" if self.compress == "gzip" else ".tar"
+        for index in range(1000):
+            filename = stem + (f"_{index}" if index else "") + extension
+            try:
+                os.close(os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            except FileExistsError:
+                continue
+            self.tar = tarfile.open(filename, "w:gz" if self.compress == "gzip" else "w")
+            return filename
+        raise FileExistsError(f"No free bundle name for {stem}")
+
+    def open(self, filename):
+        """Return a QueuedFile for an Outputs file and the name under which it will be found."""
+        handle = QueuedFile(self)
+        if self.bundle:
+            self.files[handle] = {"name": os.path.basename(filename), "chunks": [], "size": 0, "file": None}
+            return handle, f"{self.bundle}:{os.path.basename(filename)}"
+        self.files[handle] = {"name": filename, "chunks": [], "size": 0, "file": None}
+        suffix = {"gzip": ".gz", "zstd": ".zst"}.get(self.compress, "")
+        return handle, filename + suffix
+
+    def run(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                return
+            action, handle, text = record
+            entry = self.files.get(handle)
+            if entry is None:
+                continue  # An earlier record of this file failed, the rest is dropped
+            try:
+                if action == "write":
+                    entry["chunks"].append(text)
+                    entry["size"] += len(text)
+                    if entry["size"] >= self.buffer_size and not self.bundle:
+                        self.flush(entry)
+                else:
+                    self.finish(entry)
+                    del self.files[handle]
+                    handle.written.set()
+            except Exception as e:
+                # Keep draining the queue, a dead writer would block every worker
+                handle.error = f"Writing {entry['name']} failed: {e}"
+                log_error(handle.error, reason="write")
+                del self.files[handle]
+                if entry["file"] is not None:
+                    with contextlib.suppress(Exception):
+                        entry["file"].close()
+                handle.written.set()
+
+    def flush(self, entry):
+        if entry["file"] is None:
+            entry["file"], entry["path"] = open_output(entry["name"], self.compress)
+        entry["file"].write("".join(entry["chunks"]))
+        entry["chunks"] = []
+        entry["size"] = 0
+
+    def finish(self, entry):
+        if self.bundle:
+            data = "".join(entry["chunks"]).encode("utf-8")
+            member = tarfile.TarInfo(entry["name"])
+            member.size = len(data)
+            member.mtime = time.time()
+            self.tar.addfile(member, io.BytesIO(data))
+            return
+        self.flush(entry)
+        entry["file"].close()
+        if self.fsync == "file":
+            sync_file(entry["path"])
+        elif self.fsync == "run":
+            self.written.append(entry["path"])
+
+    def close(self):
+        """Write what is still queued, then close (and sync) the files of the run."""
+        self.records.put(None)
+        self.thread.join()
+        if self.tar is not None:
+            self.tar.close()
+            if self.fsync != "none":
+                sync_file(self.bundle)
+        for filename in self.written:
+            sync_file(filename)
+
+
+def sync_file(filename):
+    """Flush a closed file's data to disk."""
+    with open(filename, "ab") as file:
+        os.fsync(file.fileno())
+
+
+class OutputStreamer:
+    """Write one command's output to a file as chunks arrive.
+
+    The echoed command line is dropped and the read stops at the trailing prompt, so the
+    file content matches what send_command would have returned, without holding it all.
+    """
+
+    def __init__(self, file, prompt):
+        self.file = file
+        self.prompt_pattern = re.compile(r"\n\*?" + re.escape(prompt.lstrip("*")) + r"\s*$")
+        self.pending = ""
+        self.echo_skipped = False
+        self.leading_newline = True
+
+    def write(self, text):
+        if text and self.leading_newline:
+            text = text[1:]  # Newline ending the echoed command line
+            self.leading_newline = False
+        self.file.write(text)
+
+    def feed(self, chunk):
+        """Process a chunk of channel data, return True once the prompt has been reached."""
+        data = self.pending + chunk.replace("\r\n", "\n").replace("\r", "")
+        if not self.echo_skipped:
+            if "\n" not in data:
+                self.pending = data
+                return False
+            data = data[data.index("\n"):]
+            self.echo_skipped = True
+        match = self.prompt_pattern.search(data)
+        if match:
+            self.write(data[:match.start()])
+            return True
+        # Hold back the tail in case the prompt is split across two chunks
+        if len(data) > 256:
+            self.write(data[:-256])
+            data = data[-256:]
+        self.pending = data
+        return False
+
+
+def stream_command(ssh_conn, command, file, prompt, read_timeout):
+    """Send a command with netmiko and stream its output into file."""
+    from netmiko import ReadTimeout
+
+    streamer = OutputStreamer(file, prompt)
+    ssh_conn.write_channel(ssh_conn.normalize_cmd(command))
+    deadline = time.monotonic() + read_timeout
+    while True:
+        chunk = ssh_conn.read_channel()
+        if chunk:
+            if streamer.feed(chunk):
+                return
+        elif time.monotonic() > deadline:
+            raise ReadTimeout(f"Prompt not found after {read_timeout}s streaming: {command}")
+        else:
+            time.sleep(0.02)
+
+
+def build_batch(commands, marker, sentinel):
+    """Join the commands into one block, each followed by a command echoing marker<index>."""
+    lines = []
+    for index, command in enumerate(commands):
+        lines.append(command)
+        lines.append(sentinel.format(marker=f"{marker}{index}"))
+    return "\n".join(lines) + "\n"
+
+
+def batch_end_pattern(commands, marker, prompt):
+    """Pattern matching the last sentinel line followed by the prompt."""
+    return re.compile(
+        rf"\n{re.escape(marker)}{len(commands) - 1}[ \t]*\n\*?{re.escape(prompt.lstrip('*'))}\s*$"
+    )
+
+
+def split_batch_output(buffer, commands, marker):
+    """Split the combined output of a batch back into one output per command."""
+    sections = re.split(rf"(?m)^{re.escape(marker)}\d+[ \t]*$", buffer)
+    outputs = []
+    for command, section in zip(commands, sections):
+        lines = section.split("\n")
+        # Drop the lines up to the echoed command and from the prompt line echoing the sentinel
+        start = next((i + 1 for i, line in enumerate(lines) if line.rstrip().endswith(command)), 0)
+        end = next((i for i in range(start, len(lines)) if marker in lines[i]), len(lines))
+        outputs.append("\n".join(lines[start:end]).strip("\n"))
+    return outputs
+
+
+def batch_commands(ssh_conn, commands, prompt, sentinel, read_timeout):
+    """Send every command in a single write and return the per-command outputs."""
+    from netmiko import ReadTimeout
+
+    marker = f"NDCE-{secrets.token_hex(4)}-"
+    end_pattern = batch_end_pattern(commands, marker, prompt)
+    ssh_conn.write_channel(build_batch(commands, marker, sentinel))
+    chunks = []
+    tail = ""
+    deadline = time.monotonic() + read_timeout
+    while not end_pattern.search(tail):
+        chunk = ssh_conn.read_channel()
+        if chunk:
+            chunk = chunk.replace("\r\n", "\n").replace("\r", "")
+            chunks.append(chunk)
+            tail = (tail + chunk)[-512:]
+        elif time.monotonic() > deadline:
+            raise ReadTimeout(f"Batch of {len(commands)} commands did not complete in {read_timeout}s")
+        else:
+            time.sleep(0.02)
+    return split_batch_output("".join(chunks), commands, marker)
+
+
+class ShellChannel:
+    """Extra SR-OS shell opened on the SSH transport of a netmiko session.
+
+    Lets pipeline_commands run show commands next to the session's own channel without
+    another TCP connection or login.
+    """
+
+    def __init__(self, ssh_conn, prompt, read_timeout=90):
+        self.prompt_pattern = re.compile(re.escape(prompt.strip()) + r"\s*$")
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.channel = ssh_conn.remote_conn.get_transport().open_session()
+        try:
+            self.channel.get_pty(term="vt100", width=512, height=24)
+            self.channel.invoke_shell()
+            self.read_until_prompt(read_timeout)
+            self.send_command("environment no more", read_timeout)
+        except BaseException:
+            self.channel.close()
+            raise
+
+    def read_until_prompt(self, read_timeout):
+        from netmiko import ReadTimeout
+        from paramiko.ssh_exception import SSHException
+
+        buffer = ""
+        deadline = time.monotonic() + read_timeout
+        while not self.prompt_pattern.search(buffer[-256:]):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ReadTimeout(f"Prompt not found after {read_timeout}s on an extra channel")
+            self.channel.settimeout(remaining)
+            try:
+                chunk = self.channel.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                raise SSHException("Channel closed before the prompt was received")
+            buffer += self.decoder.decode(chunk).replace("\r\n", "\n").replace("\r", "")
+        return buffer
+
+    def send_command(self, command, read_timeout):
+        """Send one command and return its output without echo and prompt, like send_command."""
+        self.channel.sendall(command + "\n")
+        lines = self.read_until_prompt(read_timeout).split("\n")
+        return "\n".join(lines[1:-1]).strip("\n")
+
+    def close(self):
+        self.channel.close()
+
+
+def pipeline_commands(ssh_conn, commands, prompt, read_timeouts, channels):
+    """Run the commands over the session's channel and up to channels - 1 extra shells.
+
+    Each channel takes the next command as soon as it is free, so the device takes about
+    as long as its slowest command instead of the sum of them. Returns the (output,
+    seconds) of every command in the original order. Extra shells the device refuses are
+    skipped, the other channels take their share.
+    """
+    pending = deque(range(len(commands)))
+    results = [None] * len(commands)
+    errors = []
+
+    def work(send):
+        try:
+            while not errors:
+                try:
+                    index = pending.popleft()
+                except IndexError:
+                    return
+                start = time.monotonic()
+                output = send(commands[index], read_timeouts[index])
+                results[index] = (output, time.monotonic() - start)
+        except BaseException as e:
+            errors.append(e)
+
+    def extra_channel():
+        try:
+            shell = ShellChannel(ssh_conn, prompt)
+        except Exception:
+            return  # Session limit reached or shell refused
+        try:
+            work(shell.send_command)
+        finally:
+            shell.close()
+
+    threads = [threading.Thread(target=extra_channel) for _ in range(min(channels, len(commands)) - 1)]
+    for thread in threads:
+        thread.start()
+    work(lambda command, read_timeout: ssh_conn.send_command(command, read_timeout=read_timeout))
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class PhaseTimer:
+    """Accumulate the wall time of the successive phases of one device run.
+
+    Each lap() charges the time elapsed since the previous lap to the named phase.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.commands = []
+        self.mark = time.monotonic()
+
+    def lap(self, phase):
+        now = time.monotonic()
+        seconds = now - self.mark
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.mark = now
+        return seconds
+
+    def command(self, command):
+        seconds = self.lap("commands")
+        self.commands.append([command, seconds])
+        return seconds
+
+    def parallel_commands(self, commands, seconds):
+        """Charge the time since the previous lap to commands run side by side, keeping each one's own time."""
+        self.lap("commands")
+        self.commands.extend([command, value] for command, value in zip(commands, seconds))
+
+    def as_dict(self):
+        return {"phases": self.phases, "commands": self.commands}
+
+
+def connect_device(device, delay_factor, timer, bastion=None):
+    """Open a netmiko session, timing the TCP connect, SSH handshake + auth and session setup.
+
+    Through a bastion the "TCP connect" is the direct-tcpip channel opened by the jump host.
+    """
+    from netmiko import ConnectHandler, NetMikoTimeoutException
+
+    try:
+        if bastion is not None:
+            sock = bastion.open_channel(device["host"], device["port"])
+        else:
+            sock = socket.create_connection((device["host"], device["port"]), timeout=10)
+    except OSError as e:
+        raise NetMikoTimeoutException(f"TCP connection to {device['host']}:{device['port']} failed: {e}")
+    timer.lap("tcp_connect")
+    ssh_conn = ConnectHandler(**device, global_delay_factor=delay_factor, sock=sock, auto_connect=False)
+    try:
+        # The steps of BaseConnection._open(), split to time each of them
+        ssh_conn._modify_connection_params()
+        ssh_conn.establish_connection()
+        timer.lap("ssh_handshake_auth")
+        ssh_conn._try_session_preparation()
+        timer.lap("session_prep")
+    except BaseException:
+        ssh_conn.disconnect()
+        raise
+    return ssh_conn
+
+
+def parse_jump_host(jump_host, default_port=22):
+    """Split [user@]host[:port] (IPv6 hosts in brackets) into (user or None, host, port)."""
+    user, _, address = jump_host.rpartition("@")
+    match = re.fullmatch(r"\[(.+)\](?::(\d+))?|([^:]+)(?::(\d+))?", address)
+    if match is None:
+        raise ValueError(f"Invalid jump host: {jump_host}")
+    host = match.group(1) or match.group(3)
+    port = match.group(2) or match.group(4) or default_port
+    return user or None, host, int(port)
+
+
+class JumpHostError(Exception):
+    """The jump host could not be reached or refused the login; no device is reachable."""
+
+
+class BastionPool:
+    """A few SSH connections to a jump host, multiplexing direct-tcpip channels to the devices.
+
+    The gateway handshake and login are paid once per transport instead of once per device;
+    channels are spread round-robin over the transports, which are opened on first use and
+    reopened if the jump host drops them. A failed connection or login to the jump host is
+    kept in failure and every later channel fails with it at once, so a wrong password
+    costs one login attempt instead of one per device (reset() rearms it for a new job).
+    """
+
+    def __init__(self, jump_host, username, password, transports=1):
+        jump_user, self.host, self.port = parse_jump_host(jump_host)
+        self.username = jump_user or username
+        self.password = password
+        self.clients = [None] * max(1, transports)
+        # One lock for every transport so concurrent workers never try two logins at once
+        self.lock = threading.Lock()
+        self.failure = None
+        self.next = 0
+
+    def reset(self):
+        self.failure = None
+
+    def transport(self, index):
+        import paramiko
+
+        with self.lock:
+            if self.failure is not None:
+                raise JumpHostError(self.failure)
+            client = self.clients[index]
+            if client is None or not client.get_transport() or not client.get_transport().is_active():
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                try:
+                    client.connect(
+                        self.host,
+                        self.port,
+                        username=self.username,
+                        password=self.password,
+                        timeout=10,
+                        banner_timeout=20,
+                    )
+                except (paramiko.SSHException, OSError) as e:
+                    client.close()
+                    self.failure = f"jump host {self.host}: {e or type(e).__name__}"
+                    raise JumpHostError(self.failure)
+                client.get_transport().set_keepalive(30)
+                self.clients[index] = client
+            return client.get_transport()
+
+    def open_channel(self, ip_address, port, timeout=10):
+        """Open a channel from the jump host to ip_address:port, usable as a socket."""
+        import paramiko
+
+        index = self.next % len(self.clients)
+        self.next += 1
+        try:
+            return self.transport(index).open_channel(
+                "direct-tcpip", (ip_address, port), ("127.0.0.1", 0), timeout=timeout
+            )
+        except paramiko.ChannelException as e:
+            raise OSError(f"jump host {self.host} could not reach it: {e.text}")
+        except paramiko.SSHException as e:
+            raise OSError(f"jump host {self.host}: {e}")
+
+    def close(self):
+        for client in self.clients:
+            if client is not None:
+                client.close()
+
+
+def jump_credentials(args, username, password):
+    """Credentials of the jump host: NDCE_JUMP_USERNAME / NDCE_JUMP_PASSWORD, else the device ones."""
+    return credentials_from_environment(args, "jump") or (username, password)
+
+
+def probe_digest(output):
+    return hashlib.sha256(output.strip().encode("utf-8")).hexdigest()
+
+
+def commands_digest(commands):
+    """Digest of a device's command list, kept with its probe so a new command is collected."""
+    return hashlib.sha256("\n".join(commands).encode("utf-8")).hexdigest()
+
+
+def unchanged_result(ip_address, host_name, probe, commands, connect_time, start, timer):
+    """Result of a device whose probe output matches the last collection (commands skipped)."""
+    progress.emit("done", ip_address, Fore.LIGHTCYAN_EX + f"[UNCHANGED] {host_name} : probe matches the last collection, skipped")
+    return {
+        "ip": ip_address,
+        "status": "done",
+        "unchanged": True,
+        "host": host_name,
+        "filename": None,
+        "probe": probe,
+        "probe_commands": commands_digest(commands),
+        "connect_time": connect_time,
+        "elapsed": time.monotonic() - start,
+        "timings": timer.as_dict(),
+    }
+
+
+def archive_outputs(directory, prompt_hostname, outputs):
+    """Put the (command, output) pairs of a device in the archive, return its manifest entry."""
+    archive = OutputArchive(directory)
+    return {
+        "prompt": prompt_hostname,
+        "outputs": [[command, archive.put(output)] for command, output in outputs],
+    }
+
+
+def execute_commands(
+    ip_address,
+    commands,
+    username,
+    password,
+    args=None,
+    pool=None,
+    profiles=None,
+    store=None,
+    probes=None,
+    spec=None,
+    bastion=None,
+    writer=None,
+):
+    """Execute commands on a given device via SSH.
+
+    spec is the entry of the device in a structured inventory, overriding the device type,
+    port, credentials and commands. With a writer the output file is written by its thread.
+    """
+    from netmiko import (
+        NetMikoTimeoutException,
+        NetMikoAuthenticationException,
+        ReadTimeout,
+    )
+    from paramiko.ssh_exception import SSHException
+
+    if args is None:
+        args = parse_args([])
     if not is_valid_ip(ip_address):
-        error_msg = f"Invalid IP address format: {ip_address}"
-        tqdm.write(Fore.LIGHTRED_EX + f"\r[ERROR] {error_msg}")
-        log_error(error_msg)
-        return
+        return report_failure(ip_address, "invalid", f" Invalid IP address format: {ip_address}")
 
+    spec = spec or {}
+    commands = spec.get("commands", commands)
+    username = spec.get("username", username)
+    password = spec.get("password", password)
+    device_type = spec.get("device_type", "nokia_sros")
+    progress.emit("start", ip_address)
+    start = time.monotonic()
+    timer = PhaseTimer()
+    ssh_conn = None
+    reading = []  # Commands whose output is being read, charged with a read timeout
     try:
         device = {
-            "device_type": "nokia_sros",
+            "device_type": device_type,
             "host": ip_address,
+            "port": spec.get("port", args.port),
             "username": username,
             "password": password,
-            "read_timeout_override": 90,
         }
-        ssh_conn = ConnectHandler(**device, global_delay_factor=2)
-        prompt_hostname = ssh_conn.find_prompt()[0:-1]
-        host_name = re.split(":", prompt_hostname)
-
-        if len(host_name) > 1:
-            host_name = host_name[1]
+        if profiles is not None:
+            delay_factor = profiles.delay_factor(ip_address)
         else:
-            host_name = ip_address  # Fallback to IP address if the prompt does not contain the expected format
+            delay_factor = 2
+            device["read_timeout_override"] = 90
+        if pool is not None:
+            ssh_conn = pool.acquire(device, lambda: connect_device(device, delay_factor, timer, bastion))
+            timer.lap("pool_checkout")
+        else:
+            ssh_conn = connect_device(device, delay_factor, timer, bastion)
+        connect_time = time.monotonic() - start
+        prompt = ssh_conn.find_prompt()
+        prompt_hostname = prompt[0:-1]
+        host_name = get_hostname(prompt_hostname, ip_address, device_type)
+        timer.lap("find_prompt")
+
+        if args.probe:
+            probe = probe_digest(ssh_conn.send_command(args.probe, read_timeout=90))
+            timer.command(args.probe)
+            if probes is not None and probes.unchanged(ip_address, args.probe, probe, commands):
+                if pool is not None:
+                    pool.release(device, ssh_conn)
+                else:
+                    ssh_conn.disconnect()
+                ssh_conn = None
+                timer.lap("disconnect")
+                return unchanged_result(ip_address, host_name, probe, commands, connect_time, start, timer)
 
         log_time = time.strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"Outputs/{host_name}_{ip_address}_{log_time}.txt"
+        filename = f"{args.output_dir}/{host_name}_{ip_address}_{log_time}.txt"
 
-        with open(filename, "w") as file:
-            for command in tqdm(
-                    commands,
-                    desc=Fore.LIGHTYELLOW_EX + f"Executing on {ip_address}",
-                    unit="Cmd",
-                    file=sys.stdout,
-                    ncols=100,
-                    leave=False,
-            ):
-                output = ssh_conn.send_command(command, delay_factor=1)
-                file.write(f"{prompt_hostname}# {command}\n{output}\n")
+        read_timeouts = [
+            profiles.read_timeout(ip_address, command) if profiles is not None else 90
+            for command in commands
+        ]
+        outputs = None
+        # The sentinel is an SR-OS echo, other platforms run the commands one by one
+        if args.batch and commands and device_type.endswith("_sros"):
+            reading = commands
+            outputs = batch_commands(ssh_conn, commands, prompt, args.batch_sentinel, sum(read_timeouts))
+            timer.command(f"<batch of {len(commands)} commands>")
+        elif args.channels > 1 and len(commands) > 1 and device_type.endswith("_sros"):
+            reading = commands
+            pipelined = pipeline_commands(ssh_conn, commands, prompt, read_timeouts, args.channels)
+            outputs = [output for output, _ in pipelined]
+            timer.parallel_commands(commands, [seconds for _, seconds in pipelined])
+            if profiles is not None:
+                for command, (_, seconds) in zip(commands, pipelined):
+                    profiles.record_command(ip_address, command, seconds)
 
-        ssh_conn.disconnect()
-        tqdm.write(
-            Fore.LIGHTGREEN_EX
-            + f"\r[SUCCESS] {host_name} : Output saved ==> {filename}"
-        )
+        stored = []
+        if args.archive:
+            file, filename = open(os.devnull, "w"), args.archive
+        elif writer is not None:
+            file, filename = writer.open(filename)
+        else:
+            file, filename = open_output(filename, args.compress)
+        timer.lap("file_write")
+        with file:
+            for index, command in enumerate(commands):
+                progress.emit("command", ip_address)
+                if outputs is not None:
+                    file.write(f"{prompt_hostname}# {command}\n{outputs[index]}\n")
+                    stored.append((command, outputs[index]))
+                    timer.lap("file_write")
+                    continue
+                reading = [command]
+                if args.stream:
+                    # Writes are interleaved with the reads and counted with the command
+                    file.write(f"{prompt_hostname}# {command}\n")
+                    stream_command(ssh_conn, command, file, prompt, read_timeouts[index])
+                    file.write("\n")
+                    seconds = timer.command(command)
+                else:
+                    output = ssh_conn.send_command(command, read_timeout=read_timeouts[index])
+                    seconds = timer.command(command)
+                    file.write(f"{prompt_hostname}# {command}\n{output}\n")
+                    stored.append((command, output))
+                    timer.lap("file_write")
+                if profiles is not None:
+                    profiles.record_command(ip_address, command, seconds)
+        timer.lap("file_write")
+        if store is not None:
+            store.add(ip_address, host_name, stored, device_type)
+            timer.lap("store")
+        if args.archive:
+            archived = archive_outputs(args.archive, prompt_hostname, stored)
+            timer.lap("store")
+
+        if pool is not None:
+            pool.release(device, ssh_conn)
+        else:
+            ssh_conn.disconnect()
+        ssh_conn = None
+        timer.lap("disconnect")
+        if isinstance(file, QueuedFile):
+            file.wait()
+            timer.lap("file_write")
+        if profiles is not None:
+            profiles.record_run(ip_address, read_timed_out=False)
+            profiles.record_duration(ip_address, time.monotonic() - start)
+        progress.emit("done", ip_address, Fore.LIGHTGREEN_EX + f"[SUCCESS] {host_name} : Output saved ==> {filename}")
+        result = {
+            "ip": ip_address,
+            "status": "done",
+            "host": host_name,
+            "filename": filename,
+            "connect_time": connect_time,
+            "elapsed": time.monotonic() - start,
+            "timings": timer.as_dict(),
+        }
+        if args.archive:
+            result["archive"] = archived
+        if args.probe:
+            result["probe"] = probe
+            result["probe_commands"] = commands_digest(commands)
+        return result
 
     except NetMikoTimeoutException:
-        error_msg = f"Host unreachable ==> {ip_address}"
-        tqdm.write(Fore.LIGHTRED_EX + "\r[ERROR]" + error_msg)
-        log_error(error_msg)
+        return report_failure(ip_address, "timeout", f"Host unreachable ==> {ip_address}", timer, start)
     except NetMikoAuthenticationException:
-        error_msg = f"Authentication failure->Login using : {username} ==> {ip_address}"
-        tqdm.write(Fore.LIGHTRED_EX + "\r[ERROR]" + error_msg)
-        log_error(error_msg)
+        return report_failure(
+            ip_address, "auth", f"Authentication failure->Login using : {username} ==> {ip_address}", timer, start
+        )
     except SSHException:
-        error_msg = f" SSH Issue. Are you sure SSH is enabled? ==> {ip_address}"
-        tqdm.write(Fore.LIGHTRED_EX + "\r[ERROR]" + error_msg)
-        log_error(error_msg)
+        return report_failure(
+            ip_address, "ssh", f" SSH Issue. Are you sure SSH is enabled? ==> {ip_address}", timer, start
+        )
+    except ReadTimeout:
+        if profiles is not None:
+            profiles.record_run(ip_address, read_timed_out=True)
+            profiles.record_read_timeouts(ip_address, reading)
+        return report_failure(ip_address, "read_timeout", f"Command output timed out ==> {ip_address}", timer, start)
+    except OutputWriteError as e:
+        return report_failure(ip_address, "write", f" {e} ==> {ip_address}", timer, start)
+    except JumpHostError as e:
+        return report_failure(ip_address, "jump_host", f" Jump host unusable, {e} ==> {ip_address}", timer, start)
+    except Exception as e:
+        return report_failure(ip_address, "error", f" Unexpected error: {e} ==> {ip_address}", timer, start)
+    finally:
+        # A session the failure left open would stay on the router through every retry; a
+        # pooled one is not given back either, its channel may still hold unread output
+        if ssh_conn is not None:
+            SessionPool.disconnect(ssh_conn)
 
 
-def log_error(error_msg):
-    """Log errors to a file with timestamp, ensuring latest logs appear at the top."""
-    logging.error(error_msg)
+async def read_until_prompt(stdout, read_timeout, prompt_pattern=PROMPT_PATTERN):
+    """Read an asyncssh shell stream until the device prompt is at the end of the buffer."""
+    buffer = ""
+    while not prompt_pattern.search(buffer[-256:]):
+        chunk = await asyncio.wait_for(stdout.read(65536), read_timeout)
+        if not chunk:
+            raise EOFError("Channel closed before the prompt was received")
+        buffer += chunk.replace("\r\n", "\n").replace("\r", "")
+    return buffer
 
-    # Read existing logs
-    if os.path.exists("LOGs/error_log.txt"):
-        with open("LOGs/error_log.txt", "r") as file:
-            existing_logs = file.readlines()
-    else:
-        existing_logs = []
 
-    # Prepend the new log entry
-    with open("LOGs/error_log.txt", "w") as file:
-        timestamp = time.strftime("%Y-%m-%d %H-%M-%S")
-        file.write(f"{timestamp}: {error_msg}\n")  # Write the new entry first
-        file.writelines(existing_logs)  # Then write the existing logs
+async def async_send_command(process, command, read_timeout, prompt_pattern):
+    """Send one command on an asyncssh shell and return its output without echo and prompt."""
+    process.stdin.write(command + "\n")
+    output = await read_until_prompt(process.stdout, read_timeout, prompt_pattern)
+    lines = output.split("\n")
+    # First line is the echoed command, last line is the prompt (same as netmiko send_command)
+    return "\n".join(lines[1:-1]).strip("\n")
 
 
-def main():
-    """Main function to execute the SSH commands."""
-    start_time = datetime.now()
-    current_date_time = time.strftime("%Y-%m-%d %H-%M-%S")
-    print(Fore.LIGHTBLUE_EX + f"Current date and time : {current_date_time}")
-    print(20 * "#", "Event Log", 20 * "#")
+async def async_stream_command(process, command, file, prompt, read_timeout):
+    """Send a command on an asyncssh shell and stream its output into file."""
+    streamer = OutputStreamer(file, prompt)
+    process.stdin.write(command + "\n")
+    while True:
+        chunk = await asyncio.wait_for(process.stdout.read(65536), read_timeout)
+        if not chunk:
+            raise EOFError("Channel closed before the prompt was received")
+        if streamer.feed(chunk):
+            return
 
-    os.makedirs("Outputs", exist_ok=True)
-    os.makedirs("LOGs", exist_ok=True)
-    # Set up logging
-    logging.basicConfig(
-        filename="LOGs/error_log.txt",
-        level=logging.ERROR,
-        format="%(asctime)s: %(message)s",
-    )
 
-    if not check_files_exist():
-        print(
-            Fore.LIGHTRED_EX
-            + "\r[ERROR] Please make sure 'IPAddressList.txt' and 'commands.txt' are available.\n\n"
-        )
-        return
+async def async_pipeline_commands(conn, process, commands, prompt_pattern, read_timeouts, channels):
+    """Async counterpart of pipeline_commands: extra shells are extra processes of the connection."""
+    import asyncssh
 
-    username, password = get_credentials()
+    async def open_extra():
+        try:
+            extra = await conn.create_process(term_type="vt100", term_size=(512, 24))
+        except asyncssh.Error:
+            return None  # Session limit reached or shell refused
+        try:
+            await read_until_prompt(extra.stdout, 90, prompt_pattern)
+            await async_send_command(extra, "environment no more", 90, prompt_pattern)
+        except (asyncssh.Error, asyncio.TimeoutError, EOFError):
+            extra.close()
+            return None
+        return extra
 
-    print(
-        Fore.CYAN
-        + "[INFO] All required files 'IPAddressList.txt' and 'commands.txt' are available."
-    )
+    opened = await asyncio.gather(*(open_extra() for _ in range(min(channels, len(commands)) - 1)))
+    extras = [extra for extra in opened if extra is not None]
+    pending = deque(range(len(commands)))
+    results = [None] * len(commands)
+
+    async def work(shell):
+        while pending:
+            index = pending.popleft()
+            start = time.monotonic()
+            output = await async_send_command(shell, commands[index], read_timeouts[index], prompt_pattern)
+            results[index] = (output, time.monotonic() - start)
 
-    with open("IPAddressList.txt", "r") as file:
-        ip_addresses = [ip.strip() for ip in file.readlines()]
+    try:
+        await asyncio.gather(*(work(shell) for shell in [process] + extras))
+    finally:
+        for extra in extras:
+            extra.close()
+    return results
 
-    with open("commands.txt", "r") as file:
-        commands = [cmd.strip() for cmd in file.readlines()]
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = []
-        for ip_address in ip_addresses:
-            futures.append(
-                executor.submit(
-                    execute_commands, ip_address, commands, username, password
+async def async_execute_commands(
+    ip_address,
+    commands,
+    username,
+    password,
+    args=None,
+    profiles=None,
+    store=None,
+    probes=None,
+    spec=None,
+    tunnels=None,
+    writer=None,
+):
+    """Execute commands on a given SR-OS device using an asyncssh session (through tunnels if given)."""
+    import asyncssh
+
+    if args is None:
+        args = parse_args([])
+
+    if not is_valid_ip(ip_address):
+        return report_failure(ip_address, "invalid", f" Invalid IP address format: {ip_address}")
+    spec = spec or {}
+    commands = spec.get("commands", commands)
+    username = spec.get("username", username)
+    password = spec.get("password", password)
+    progress.emit("start", ip_address)
+
+    read_timeout = 90
+    read_timeouts = [
+        profiles.read_timeout(ip_address, command) if profiles is not None else read_timeout
+        for command in commands
+    ]
+    connected = False
+    reading = []  # Commands whose output is being read, charged with a read timeout
+    start = time.monotonic()
+    timer = PhaseTimer()
+    try:
+        port = spec.get("port", args.port)
+        if tunnels is not None:
+            # The direct-tcpip channel is opened inside connect(), its time counts as handshake
+            target = {"host": ip_address, "port": port, "tunnel": await tunnels.get()}
+        else:
+            family = socket.AF_INET6 if ipaddress.ip_address(ip_address).version == 6 else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (ip_address, port)), 20)
+            except BaseException:
+                sock.close()
+                raise
+            timer.lap("tcp_connect")
+            target = {"sock": sock}
+        async with asyncssh.connect(
+            **target,
+            username=username,
+            password=password,
+            known_hosts=None,
+            connect_timeout=20,
+        ) as conn:
+            connected = True
+            timer.lap("ssh_handshake_auth")
+            connect_time = time.monotonic() - start
+            process = await conn.create_process(term_type="vt100", term_size=(512, 24))
+            prompt = (await read_until_prompt(process.stdout, read_timeout)).strip().split("\n")[-1]
+            prompt_hostname = prompt.strip()[0:-1]
+            host_name = get_hostname(prompt_hostname, ip_address)
+            prompt_pattern = re.compile(re.escape(prompt.strip()) + r"\s*$")
+            timer.lap("find_prompt")
+            await async_send_command(process, "environment no more", read_timeout, prompt_pattern)
+            timer.lap("session_prep")
+
+            if args.probe:
+                probe = probe_digest(await async_send_command(process, args.probe, 90, prompt_pattern))
+                timer.command(args.probe)
+                if probes is not None and probes.unchanged(ip_address, args.probe, probe, commands):
+                    process.stdin.write("logout\n")
+                    process.close()
+                    timer.lap("disconnect")
+                    return unchanged_result(ip_address, host_name, probe, commands, connect_time, start, timer)
+
+            log_time = time.strftime("%Y-%m-%d_%H-%M-%S")
+            filename = f"{args.output_dir}/{host_name}_{ip_address}_{log_time}.txt"
+
+            outputs = None
+            if args.batch and commands:
+                reading = commands
+                marker = f"NDCE-{secrets.token_hex(4)}-"
+                process.stdin.write(build_batch(commands, marker, args.batch_sentinel))
+                buffer = await read_until_prompt(
+                    process.stdout, max(read_timeouts), batch_end_pattern(commands, marker, prompt.strip())
                 )
+                outputs = split_batch_output(buffer, commands, marker)
+                timer.command(f"<batch of {len(commands)} commands>")
+            elif args.channels > 1 and len(commands) > 1:
+                reading = commands
+                pipelined = await async_pipeline_commands(
+                    conn, process, commands, prompt_pattern, read_timeouts, args.channels
+                )
+                outputs = [output for output, _ in pipelined]
+                timer.parallel_commands(commands, [seconds for _, seconds in pipelined])
+                if profiles is not None:
+                    for command, (_, seconds) in zip(commands, pipelined):
+                        profiles.record_command(ip_address, command, seconds)
+
+            stored = []
+            if args.archive:
+                file, filename = open(os.devnull, "w"), args.archive
+            elif writer is not None:
+                file, filename = writer.open(filename)
+            else:
+                file, filename = open_output(filename, args.compress)
+            timer.lap("file_write")
+            with file:
+                for index, command in enumerate(commands):
+                    progress.emit("command", ip_address)
+                    if outputs is not None:
+                        file.write(f"{prompt_hostname}# {command}\n{outputs[index]}\n")
+                        stored.append((command, outputs[index]))
+                        timer.lap("file_write")
+                        continue
+                    reading = [command]
+                    if args.stream:
+                        file.write(f"{prompt_hostname}# {command}\n")
+                        await async_stream_command(
+                            process, command, file, prompt.strip(), read_timeouts[index]
+                        )
+                        file.write("\n")
+                        seconds = timer.command(command)
+                    else:
+                        output = await async_send_command(
+                            process, command, read_timeouts[index], prompt_pattern
+                        )
+                        seconds = timer.command(command)
+                        file.write(f"{prompt_hostname}# {command}\n{output}\n")
+                        stored.append((command, output))
+                        timer.lap("file_write")
+                    if profiles is not None:
+                        profiles.record_command(ip_address, command, seconds)
+            timer.lap("file_write")
+            if store is not None:
+                store.add(ip_address, host_name, stored)
+                timer.lap("store")
+            if args.archive:
+                archived = archive_outputs(args.archive, prompt_hostname, stored)
+                timer.lap("store")
+
+            process.stdin.write("logout\n")
+            process.close()
+        timer.lap("disconnect")
+        if isinstance(file, QueuedFile):
+            # The writer thread sets an Event, wait for it without blocking the loop
+            await asyncio.get_running_loop().run_in_executor(None, file.wait)
+            timer.lap("file_write")
+        if profiles is not None:
+            profiles.record_duration(ip_address, time.monotonic() - start)
+
+        progress.emit("done", ip_address, Fore.LIGHTGREEN_EX + f"[SUCCESS] {host_name} : Output saved ==> {filename}")
+        result = {
+            "ip": ip_address,
+            "status": "done",
+            "host": host_name,
+            "filename": filename,
+            "connect_time": connect_time,
+            "elapsed": time.monotonic() - start,
+            "timings": timer.as_dict(),
+        }
+        if args.archive:
+            result["archive"] = archived
+        if args.probe:
+            result["probe"] = probe
+            result["probe_commands"] = commands_digest(commands)
+        return result
+
+    except OutputWriteError as e:
+        return report_failure(ip_address, "write", f" {e} ==> {ip_address}", timer, start)
+    except JumpHostError as e:
+        return report_failure(ip_address, "jump_host", f" Jump host unusable, {e} ==> {ip_address}", timer, start)
+    except asyncssh.PermissionDenied:
+        return report_failure(
+            ip_address, "auth", f"Authentication failure->Login using : {username} ==> {ip_address}", timer, start
+        )
+    except asyncio.TimeoutError:
+        if connected:
+            if profiles is not None:
+                profiles.record_run(ip_address, read_timed_out=True)
+                profiles.record_read_timeouts(ip_address, reading)
+            return report_failure(
+                ip_address, "read_timeout", f"Command output timed out ==> {ip_address}", timer, start
             )
+        return report_failure(ip_address, "timeout", f"Host unreachable ==> {ip_address}", timer, start)
+    except OSError:
+        return report_failure(ip_address, "timeout", f"Host unreachable ==> {ip_address}", timer, start)
+    except (asyncssh.Error, EOFError):
+        return report_failure(
+            ip_address, "ssh", f" SSH Issue. Are you sure SSH is enabled? ==> {ip_address}", timer, start
+        )
+    except Exception as e:
+        return report_failure(ip_address, "error", f" Unexpected error: {e} ==> {ip_address}", timer, start)
 
-        for future in futures:
-            future.result()
 
-    end_time = datetime.now()
-    print(Fore.CYAN + f"[INFO] Elapsed Time: {end_time - start_time} Min\n")
+class TimingProfiles:
+    """Per-device and per-command timing learned from previous runs.
 
-    want_save = input(
-        f"\n{Fore.YELLOW}Do you want to open the Outputs folder? (y/n): "
-        + Style.RESET_ALL
-    )
-    if want_save.lower() == "y":
-        open_file("Outputs")
+    The global_delay_factor of a device is halved after every clean run (down to
+    MIN_DELAY_FACTOR) and doubled again after a read timeout. The read timeout of a
+    command is a multiple of the slowest run seen for that device/command pair, and is
+    lengthened when that command times out.
+    Unknown devices and commands get the historical defaults (2 and 90 seconds). The
+    duration of each device's complete runs is averaged too, for longest-first ordering.
+    """
 
-    input(Fore.MAGENTA + "Press Enter to continue..." + Style.RESET_ALL)
-    main_menu()
+    DEFAULT_DELAY_FACTOR = 2
+    MIN_DELAY_FACTOR = 0.25
+    MAX_DELAY_FACTOR = 4
+    DEFAULT_READ_TIMEOUT = 90
 
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.devices = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as file:
+                self.devices = json.load(file)
 
-if __name__ == "__main__":
+    def device(self, ip_address):
+        return self.devices.setdefault(ip_address, {"delay_factor": self.DEFAULT_DELAY_FACTOR, "commands": {}})
+
+    def delay_factor(self, ip_address):
+        with self.lock:
+            return self.devices.get(ip_address, {}).get("delay_factor", self.DEFAULT_DELAY_FACTOR)
+
+    def read_timeout(self, ip_address, command):
+        with self.lock:
+            history = self.devices.get(ip_address, {}).get("commands", {}).get(command)
+        if history is None:
+            return self.DEFAULT_READ_TIMEOUT
+        return min(600, max(10, round(history["max"] * 3 + 5)))
+
+    def record_read_timeouts(self, ip_address, commands):
+        """Lengthen the read timeout of commands whose output timed out.
+
+        A learned timeout below the default is forgotten, so the next attempt waits
+        DEFAULT_READ_TIMEOUT; a longer one is doubled (up to the 600 second cap).
+        """
+        with self.lock:
+            history = self.devices.get(ip_address, {}).get("commands", {})
+            for command in commands:
+                if command not in history:
+                    continue
+                if round(history[command]["max"] * 3 + 5) < self.DEFAULT_READ_TIMEOUT:
+                    del history[command]
+                else:
+                    history[command]["max"] *= 2
+
+    def record_command(self, ip_address, command, seconds):
+        with self.lock:
+            history = self.device(ip_address)["commands"].setdefault(command, {"max": 0.0, "ewma": seconds})
+            history["max"] = max(history["max"], seconds)
+            history["ewma"] = 0.7 * history["ewma"] + 0.3 * seconds
+
+    def record_duration(self, ip_address, seconds):
+        """Average the wall time of a complete run of the device."""
+        with self.lock:
+            profile = self.device(ip_address)
+            profile["duration"] = 0.7 * profile.get("duration", seconds) + 0.3 * seconds
+
+    def expected_durations(self, ip_addresses):
+        """Expected run time of each device; devices never timed get the mean of the others.
+
+        Returns an empty dict when no device has been timed yet.
+        """
+        with self.lock:
+            known = {
+                ip_address: self.devices[ip_address]["duration"]
+                for ip_address in ip_addresses
+                if "duration" in self.devices.get(ip_address, {})
+            }
+        if not known:
+            return {}
+        mean = sum(known.values()) / len(known)
+        return {ip_address: known.get(ip_address, mean) for ip_address in ip_addresses}
+
+    def record_run(self, ip_address, read_timed_out):
+        """Adjust the delay factor of a device after a run that reached it."""
+        with self.lock:
+            profile = self.device(ip_address)
+            if read_timed_out:
+                profile["delay_factor"] = min(self.MAX_DELAY_FACTOR, profile["delay_factor"] * 2)
+            else:
+                profile["delay_factor"] = max(self.MIN_DELAY_FACTOR, profile["delay_factor"] / 2)
+
+    def save(self):
+        """Write the profiles atomically so an interrupted run never leaves a truncated cache."""
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.devices, indent=1, sort_keys=True)
+        with open(self.filename + ".tmp", "w") as file:
+            file.write(data)
+        os.replace(self.filename + ".tmp", self.filename)
+
+
+class ProbeCache:
+    """Probe output digest of every device at its last complete collection.
+
+    The digest of the commands collected then is kept with it, so a device is skipped only
+    when neither its probe output nor its command list changed. Workers only read it; the parent process updates it from the "probe" entries of the
+    results once the run is over, so a device is skipped only after a collection succeeded.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.devices = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as file:
+                self.devices = json.load(file)
+
+    def unchanged(self, ip_address, probe, digest, commands):
+        expected = {"probe": probe, "digest": digest, "commands": commands_digest(commands)}
+        return self.devices.get(ip_address) == expected
+
+    def update(self, results, probe):
+        for result in results:
+            if result["status"] == "done" and "probe" in result:
+                self.devices[result["ip"]] = {
+                    "probe": probe, "digest": result["probe"], "commands": result["probe_commands"]
+                }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        with open(self.filename + ".tmp", "w") as file:
+            json.dump(self.devices, file, indent=1, sort_keys=True)
+        os.replace(self.filename + ".tmp", self.filename)
+
+
+class ResultStore:
+    """SQLite store of every (device, command, time, output), one file for the whole fleet.
+
+    Raw outputs go to the outputs table. When a TextFSM template matches a command (a
+    file named after the command in template_dir, e.g. show_bof.textfsm, or an
+    ntc-templates entry) its records also go to a parsed_<command> table with one column
+    per template value, so fleet-wide questions are a single SQL query. ntc-templates are
+    looked up for the platform of each device.
+    """
+
+    # netmiko device types named differently in ntc-templates, the others match
+    NTC_PLATFORMS = {"nokia_sros": "alcatel_sros"}
+
+    def __init__(self, filename, template_dir=None):
+        self.filename = filename
+        self.template_dir = template_dir
+        self.lock = threading.Lock()
+        self.columns = {}
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self.db = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        with self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS outputs "
+                "(ip TEXT, host TEXT, command TEXT, collected_at TEXT, output TEXT)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS outputs_command_ip ON outputs (command, ip, collected_at)")
+            self.db.execute(
+                "CREATE VIEW IF NOT EXISTS latest_outputs AS SELECT * FROM outputs AS o WHERE collected_at = "
+                "(SELECT MAX(collected_at) FROM outputs WHERE ip = o.ip AND command = o.command)"
+            )
+
+    @staticmethod
+    def table_name(command):
+        return "parsed_" + (re.sub(r"\W+", "_", command.lower()).strip("_") or "output")
+
+    def parse(self, command, output, device_type="nokia_sros"):
+        """Return the TextFSM records of an output, or None when no template applies."""
+        from netmiko.utilities import get_structured_data_textfsm
+
+        template = None
+        if self.template_dir:
+            template = os.path.join(self.template_dir, re.sub(r"\W+", "_", command.strip()) + ".textfsm")
+            if not os.path.exists(template):
+                template = None
+        try:
+            platform = self.NTC_PLATFORMS.get(device_type, device_type)
+            records = get_structured_data_textfsm(output, platform, command, template)
+        except Exception as e:
+            log_error(f"TextFSM parsing failed for '{command}': {e}", reason="parse")
+            return None
+        return records if isinstance(records, list) else None
+
+    def ensure_table(self, table, fields):
+        known = self.columns.get(table)
+        if known is None:
+            self.db.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (ip TEXT, host TEXT, collected_at TEXT)'
+            )
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS "{table}_ip" ON "{table}" (ip, collected_at)')
+            known = self.columns[table] = {row[1] for row in self.db.execute(f'PRAGMA table_info("{table}")')}
+        for field in fields:
+            if field not in known:
+                self.db.execute(f'ALTER TABLE "{table}" ADD COLUMN "{field}"')
+                known.add(field)
+
+    def add(self, ip_address, host, outputs, device_type="nokia_sros"):
+        """Store the (command, output) pairs collected from one device in one transaction."""
+        collected_at = datetime.now().isoformat(timespec="seconds")
+        parsed = [(command, self.parse(command, output, device_type)) for command, output in outputs]
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO outputs VALUES (?, ?, ?, ?, ?)",
+                [(ip_address, host, command, collected_at, output) for command, output in outputs],
+            )
+            for command, records in parsed:
+                if not records:
+                    continue
+                table = self.table_name(command)
+                fields = [field.lower() for field in records[0]]
+                self.ensure_table(table, fields)
+                columns = ", ".join(f'"{field}"' for field in ["ip", "host", "collected_at"] + fields)
+                placeholders = ", ".join("?" * (len(fields) + 3))
+                self.db.executemany(
+                    f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})',
+                    [
+                        [ip_address, host, collected_at]
+                        + [json.dumps(value) if isinstance(value, list) else value for value in record.values()]
+                        for record in records
+                    ],
+                )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class OutputArchive:
+    """Content-addressed archive of command outputs shared by every run.
+
+    Each output is stored once as blobs/<sha256[:2]>/<sha256>.gz whatever the number of
+    runs and devices returning it; runs/<run>.json maps every device and command of a
+    run to its blob. Identical daily outputs therefore cost a few bytes of manifest and
+    two runs are compared by their hashes, only changed outputs are decompressed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.runs_dir = os.path.join(directory, "runs")
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest + ".gz")
+
+    def put(self, output):
+        """Store an output unless the same content is already archived, return its digest."""
+        data = output.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        filename = self.blob_path(digest)
+        if not os.path.exists(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            temporary = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, filename)
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self.blob_path(digest), "rb") as file:
+            return file.read().decode("utf-8")
+
+    def runs(self):
+        """Names of the archived runs, oldest first."""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.runs_dir) if name.endswith(".json"))
+
+    def load_run(self, run):
+        with open(os.path.join(self.runs_dir, run + ".json"), "r") as file:
+            return json.load(file)
+
+    def save_run(self, results, previous=None):
+        """Write the manifest of a run from the "archive" entries of its results, return the run name.
+
+        Devices skipped as unchanged (--probe) keep their entry of the previous run.
+        """
+        os.makedirs(self.runs_dir, exist_ok=True)
+        run = time.strftime("%Y-%m-%d_%H-%M-%S")
+        if os.path.exists(os.path.join(self.runs_dir, run + ".json")):
+            run += f"_{os.getpid()}"
+        devices = {
+            result["ip"]: {"host": result["host"], "prompt": result["archive"]["prompt"],
+                           "outputs": result["archive"]["outputs"]}
+            for result in results
+            if result["status"] == "done" and "archive" in result
+        }
+        if previous is not None:
+            carried = self.load_run(previous)["devices"]
+            for result in results:
+                if result.get("unchanged") and result["ip"] in carried:
+                    devices[result["ip"]] = carried[result["ip"]]
+        with open(os.path.join(self.runs_dir, run + ".json.tmp"), "w") as file:
+            json.dump({"run": run, "devices": devices}, file, indent=1)
+        os.replace(os.path.join(self.runs_dir, run + ".json.tmp"), os.path.join(self.runs_dir, run + ".json"))
+        return run
+
+    def diff(self, old_run, new_run):
+        """Compare two runs: return (changes, unified diff text) where changes lists (ip, host, what)."""
+        old = self.load_run(old_run)["devices"]
+        new = self.load_run(new_run)["devices"]
+        changes = []
+        lines = []
+        for ip_address in sorted(set(old) | set(new)):
+            if ip_address not in new:
+                changes.append((ip_address, old[ip_address]["host"], "missing from the new run"))
+                continue
+            if ip_address not in old:
+                changes.append((ip_address, new[ip_address]["host"], "new device"))
+                continue
+            before = dict((command, digest) for command, digest in old[ip_address]["outputs"])
+            for command, digest in new[ip_address]["outputs"]:
+                if before.get(command, digest) == digest:
+                    continue
+                host = new[ip_address]["host"]
+                changes.append((ip_address, host, command))
+                lines.extend(difflib.unified_diff(
+                    self.get(before[command]).splitlines(),
+                    self.get(digest).splitlines(),
+                    f"{old_run}/{host}_{ip_address}/{command}",
+                    f"{new_run}/{host}_{ip_address}/{command}",
+                    lineterm="",
+                ))
+        return changes, "\n".join(lines)
+
+    def export(self, run, output_dir):
+        """Write a run back as the usual {host}_{ip}_{time}.txt files, return their number."""
+        manifest = self.load_run(run)
+        os.makedirs(output_dir, exist_ok=True)
+        for ip_address, device in manifest["devices"].items():
+            with open(os.path.join(output_dir, f"{device['host']}_{ip_address}_{run}.txt"), "w") as file:
+                for command, digest in device["outputs"]:
+                    file.write(f"{device['prompt']}# {command}\n{self.get(digest)}\n")
+        return len(manifest["devices"])
+
+
+def report_archive_diff(archive, old_run, new_run):
+    """Print the changes between two archived runs and save the full diff next to the manifests."""
+    changes, text = archive.diff(old_run, new_run)
+    print(Fore.CYAN + f"[INFO] {len(changes)} changed outputs since {old_run}")
+    for ip_address, host, what in changes:
+        print(Fore.YELLOW + f"  {host} ({ip_address}): {what}")
+    if text:
+        filename = os.path.join(archive.runs_dir, f"{new_run}.diff")
+        with open(filename, "w") as file:
+            file.write(text + "\n")
+        print(Fore.CYAN + f"[INFO] Full diff saved ==> {filename}")
+
+
+class AdaptiveScheduler:
+    """Decide which devices may start, adapting concurrency to measured latency and timeouts.
+
+    Concurrency grows by one per healthy completion up to max_concurrency and is halved
+    when a device times out or the connect latency doubles compared to the best seen.
+    Devices sharing a site never exceed that site's cap. Devices put back with requeue()
+    wait in a heap until their retry is due, without holding a slot. With durations
+    (expected seconds per device) the longest devices start first and sites are visited
+    heaviest head first, so the slowest routers do not start last and stretch the run.
+    """
+
+    def __init__(
+        self, ip_addresses, max_concurrency, initial=8, sites=None, site_limits=None, adaptive=True, durations=None
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency if not adaptive else max(1, min(initial, max_concurrency))
+        self.adaptive = adaptive
+        self.sites = sites or {}
+        self.site_limits = site_limits or {}
+        self.durations = durations or {}
+        if self.durations:
+            ip_addresses = sorted(ip_addresses, key=lambda ip_address: self.durations.get(ip_address, 0.0), reverse=True)
+        self.queues = {}
+        for ip_address in ip_addresses:
+            self.queues.setdefault(self.sites.get(ip_address), deque()).append(ip_address)
+        self.delayed = []
+        self.in_flight = 0
+        self.site_in_flight = {}
+        self.best_connect = None
+        self.connect_ewma = None
+        self.last_decrease = 0.0
+
+    def pending(self):
+        return bool(self.delayed) or any(self.queues.values())
+
+    def head_duration(self, item):
+        """Expected duration of the next device of a (site, queue) item."""
+        waiting = item[1]
+        return self.durations.get(waiting[0], 0.0) if waiting else 0.0
+
+    def requeue(self, ip_address, site, delay):
+        """Put a device back in its site queue once delay seconds have passed."""
+        heapq.heappush(self.delayed, (time.monotonic() + delay, ip_address, site))
+
+    def next_due(self):
+        """Seconds until the next delayed device is due, None when none is waiting."""
+        if not self.delayed:
+            return None
+        return max(0.0, self.delayed[0][0] - time.monotonic())
+
+    def ready(self):
+        """Pop and return the devices that may start now, round-robin over sites."""
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, ip_address, site = heapq.heappop(self.delayed)
+            # Retries go first so a device does not wait for the whole queue twice
+            self.queues.setdefault(site, deque()).appendleft(ip_address)
+        started = []
+        while self.in_flight < self.limit:
+            advanced = False
+            queues = self.queues.items()
+            if self.durations:
+                queues = sorted(queues, key=self.head_duration, reverse=True)
+            for site, waiting in queues:
+                if not waiting or self.in_flight >= self.limit:
+                    continue
+                cap = self.site_limits.get(site)
+                if cap is not None and self.site_in_flight.get(site, 0) >= cap:
+                    continue
+                started.append((waiting.popleft(), site))
+                self.in_flight += 1
+                self.site_in_flight[site] = self.site_in_flight.get(site, 0) + 1
+                advanced = True
+            if not advanced:
+                break
+        return started
+
+    def finished(self, site, result):
+        """Release the slot of a finished device and adapt the concurrency limit."""
+        self.in_flight -= 1
+        self.site_in_flight[site] -= 1
+        if not self.adaptive:
+            return
+
+        if result.get("reason") == "timeout":
+            self.decrease()
+        elif result["status"] == "done":
+            # Only a real handshake measures the latency, a pooled session is checked out in no time
+            connect_time = result.get("timings", {}).get("phases", {}).get("ssh_handshake_auth")
+            if connect_time is None:
+                if self.limit < self.max_concurrency:
+                    self.limit += 1
+                return
+            if self.best_connect is None or connect_time < self.best_connect:
+                self.best_connect = connect_time
+            if self.connect_ewma is None:
+                self.connect_ewma = connect_time
+            else:
+                self.connect_ewma = 0.8 * self.connect_ewma + 0.2 * connect_time
+            if self.connect_ewma > 2 * self.best_connect:
+                self.decrease()
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+
+    def decrease(self):
+        """Halve the limit, at most once per connect round-trip so one burst counts once."""
+        now = time.monotonic()
+        if now - self.last_decrease < (self.connect_ewma or 1.0):
+            return
+        self.last_decrease = now
+        self.limit = max(1, self.limit // 2)
+
+
+class RetryPolicy:
+    """Decide whether a failed device goes back to the queue, and after how long.
+
+    Each failure reason has its own number of retries and base backoff; the delay is drawn
+    uniformly between 0 and base * 2^(attempt - 1), capped at MAX_BACKOFF, so hosts failing
+    together do not come back together. Reasons without a policy (auth, invalid,
+    unreachable) are final. The retries are always spent first; a host whose last
+    retry fails after breaker_threshold failures in a row has its circuit opened and, for
+    breaker_cooldown seconds, fails at once without connecting (in the daemon the policy
+    outlives the jobs). The first attempt after the cooldown closes the circuit again if
+    it succeeds and reopens it, without retries, if it fails.
+    """
+
+    # Failure reason -> (retries, base backoff in seconds)
+    POLICIES = {"timeout": (3, 2.0), "read_timeout": (1, 5.0), "ssh": (2, 1.0), "error": (1, 1.0)}
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, max_retries=3, breaker_threshold=3, breaker_cooldown=300):
+        self.max_retries = max_retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.attempts = {}
+        self.failures = {}
+        self.opened = {}
+
+    def rejected(self, ip_address):
+        """Failure result for a host whose circuit is open, None when it may be attempted."""
+        opened = self.opened.get(ip_address)
+        if opened is None or time.monotonic() - opened >= self.breaker_cooldown:
+            return None
+        return report_failure(
+            ip_address,
+            "circuit_open",
+            f" Circuit open after {self.failures[ip_address]} failures, not attempted ==> {ip_address}",
+        )
+
+    def retry_delay(self, result):
+        """Record the outcome of an attempt, return the backoff before the next one or None."""
+        ip_address = result["ip"]
+        self.attempts[ip_address] = self.attempts.get(ip_address, 0) + 1
+        result["attempts"] = self.attempts[ip_address]
+        if result["status"] == "done":
+            self.failures.pop(ip_address, None)
+            self.opened.pop(ip_address, None)
+            return None
+        policy = self.POLICIES.get(result["reason"])
+        if policy is None:
+            return None
+        self.failures[ip_address] = self.failures.get(ip_address, 0) + 1
+        if ip_address in self.opened:
+            # The trial attempt after the cooldown failed, the circuit opens again at once
+            self.opened[ip_address] = time.monotonic()
+            return None
+        retries, base = policy
+        if self.attempts[ip_address] <= min(retries, self.max_retries):
+            return random.uniform(0, min(self.MAX_BACKOFF, base * 2 ** (self.attempts[ip_address] - 1)))
+        if self.failures[ip_address] >= self.breaker_threshold:
+            self.opened[ip_address] = time.monotonic()
+        return None
+
+    def forget(self, ip_addresses):
+        """Reset the attempt counters at the start of a job (circuits stay as they are)."""
+        for ip_address in ip_addresses:
+            self.attempts.pop(ip_address, None)
+
+
+def settle(result, site, scheduler, retries, results, manifest):
+    """Release the slot of a finished attempt, then requeue the device or record its result."""
+    scheduler.finished(site, result)
+    delay = retries.retry_delay(result) if retries is not None else None
+    if delay is not None:
+        progress.emit(
+            "retry",
+            result["ip"],
+            Fore.YELLOW + f"[RETRY] {result['ip']} : {result['reason']}, attempt {result['attempts'] + 1} in {delay:.1f}s",
+        )
+        scheduler.requeue(result["ip"], site, delay)
+        return
+    results.append(result)
+    if manifest is not None:
+        manifest.record(result)
+
+
+async def run_async_engine(
+    ip_addresses,
+    commands,
+    username,
+    password,
+    args,
+    scheduler,
+    profiles=None,
+    manifest=None,
+    store=None,
+    probes=None,
+    devices=None,
+    bastion=None,
+    retries=None,
+    writer=None,
+):
+    """Run the devices as asyncio tasks, as many at a time as the scheduler allows."""
+    devices = devices or {}
+    tunnels = AsyncTunnels(bastion) if bastion is not None else None
+    running = {}
+    results = []
     try:
-        main_menu()
+        while scheduler.pending() or running:
+            for ip_address, site in scheduler.ready():
+                rejected = retries.rejected(ip_address) if retries is not None else None
+                if rejected is not None:
+                    settle(rejected, site, scheduler, retries, results, manifest)
+                    continue
+                spec = devices.get(ip_address)
+                if spec is None or spec["device_type"].endswith("_sros"):
+                    task = asyncio.ensure_future(
+                        async_execute_commands(
+                            ip_address, commands, username, password, args, profiles, store, probes, spec, tunnels,
+                            writer,
+                        )
+                    )
+                else:
+                    # The asyncssh session only speaks the SR-OS CLI, other platforms go through netmiko
+                    task = asyncio.get_running_loop().run_in_executor(
+                        None,
+                        execute_commands,
+                        ip_address,
+                        commands,
+                        username,
+                        password,
+                        args,
+                        None,
+                        profiles,
+                        store,
+                        probes,
+                        spec,
+                        bastion,
+                        writer,
+                    )
+                running[task] = site
+            if not running:
+                # Only devices waiting for their retry backoff are left
+                await asyncio.sleep(scheduler.next_due() or 0)
+                continue
+            done, _ = await asyncio.wait(
+                running, timeout=scheduler.next_due(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                settle(task.result(), running.pop(task), scheduler, retries, results, manifest)
+    finally:
+        if tunnels is not None:
+            await tunnels.close()
+    return results
+
+
+class AsyncTunnels:
+    """asyncssh connections to the jump host of a BastionPool, used as tunnels by the async engine.
+
+    Opened on first use (one per transport of the pool) and shared round-robin by the devices.
+    A failure to connect or log in is recorded in the pool like on the thread side.
+    """
+
+    def __init__(self, bastion):
+        self.bastion = bastion
+        self.connections = [None] * len(bastion.clients)
+        self.lock = asyncio.Lock()
+        self.next = 0
+
+    async def get(self):
+        import asyncssh
+
+        index = self.next % len(self.connections)
+        self.next += 1
+        async with self.lock:
+            if self.bastion.failure is not None:
+                raise JumpHostError(self.bastion.failure)
+            if self.connections[index] is None:
+                try:
+                    self.connections[index] = await asyncssh.connect(
+                        self.bastion.host,
+                        self.bastion.port,
+                        username=self.bastion.username,
+                        password=self.bastion.password,
+                        known_hosts=None,
+                        connect_timeout=20,
+                        keepalive_interval=30,
+                    )
+                except (asyncssh.Error, OSError, asyncio.TimeoutError) as e:
+                    self.bastion.failure = f"jump host {self.bastion.host}: {e or type(e).__name__}"
+                    raise JumpHostError(self.bastion.failure)
+            return self.connections[index]
+
+    async def close(self):
+        for connection in self.connections:
+            if connection is not None:
+                connection.close()
+                await connection.wait_closed()
+
+
+class JobManifest:
+    """State of every device of a job (pending, done or failed), kept on disk for --resume.
+
+    The manifest is rewritten atomically (temporary file + rename) as results come in, at
+    most once per save_interval seconds, and always when the run ends or is interrupted.
+    """
+
+    def __init__(self, filename, commands, devices, save_interval=1.0):
+        self.filename = filename
+        self.commands = commands
+        self.devices = devices
+        self.save_interval = save_interval
+        self.last_save = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, filename, ip_addresses, commands):
+        manifest = cls(filename, commands, {ip_address: {"state": "pending"} for ip_address in ip_addresses})
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "r") as file:
+            data = json.load(file)
+        return cls(filename, data["commands"], data["devices"])
+
+    def remaining(self):
+        """Devices still pending or failed, in their original order."""
+        return [ip_address for ip_address, device in self.devices.items() if device["state"] != "done"]
+
+    def record(self, result):
+        with self.lock:
+            if result["status"] == "done":
+                self.devices[result["ip"]] = {"state": "done", "output": result["filename"]}
+            else:
+                self.devices[result["ip"]] = {"state": "failed", "reason": result["error"].strip()}
+            due = time.monotonic() - self.last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self):
+        with self.lock:
+            self.last_save = time.monotonic()
+            data = json.dumps({"commands": self.commands, "devices": self.devices}, indent=1)
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            with open(self.filename + ".tmp", "w") as file:
+                file.write(data)
+            os.replace(self.filename + ".tmp", self.filename)
+
+
+async def probe_port(ip_address, port, timeout):
+    """Return True when a TCP connection to ip_address:port succeeds within timeout."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip_address, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def sweep_ports(ip_addresses, port, timeout, concurrency, ports=None):
+    """Probe every address at once (bounded by concurrency) and return the reachable ones.
+
+    ports maps the addresses that do not listen on the default port to their own port.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    ports = ports or {}
+
+    async def bounded(ip_address):
+        async with semaphore:
+            return await probe_port(ip_address, ports.get(ip_address, port), timeout)
+
+    reachable = await asyncio.gather(*(bounded(ip_address) for ip_address in ip_addresses))
+    return {ip_address for ip_address, alive in zip(ip_addresses, reachable) if alive}
+
+
+def preflight(ip_addresses, args, devices=None):
+    """Split the devices into live ones and failure results for hosts not answering on SSH.
+
+    Invalid addresses are kept so the worker reports them as before.
+    """
+    candidates = [ip_address for ip_address in ip_addresses if is_valid_ip(ip_address)]
+    ports = {ip_address: spec["port"] for ip_address, spec in (devices or {}).items() if "port" in spec}
+    reachable = asyncio.run(
+        sweep_ports(candidates, args.port, args.preflight_timeout, args.preflight_concurrency, ports)
+    )
+    live = []
+    failures = []
+    for ip_address in ip_addresses:
+        if ip_address in reachable or not is_valid_ip(ip_address):
+            live.append(ip_address)
+        else:
+            failures.append(
+                report_failure(
+                    ip_address,
+                    "unreachable",
+                    f"Host unreachable (no answer on port {ports.get(ip_address, args.port)}) ==> {ip_address}",
+                )
+            )
+    print(
+        Fore.CYAN
+        + f"[INFO] Pre-flight: {len(candidates) - len(failures)} of {len(candidates)} devices answer on port {args.port}"
+    )
+    return live, failures
+
+
+def run_engine(
+    ip_addresses,
+    commands,
+    username,
+    password,
+    args,
+    sites=None,
+    site_limits=None,
+    pool=None,
+    manifest=None,
+    profiles=None,
+    devices=None,
+    bastion=None,
+    retries=None,
+):
+    """Execute the commands on every device with the engine selected on the command line.
+
+    When profiles is given the caller owns it and saves it, otherwise the timing profiles
+    of args.timing_profiles are loaded and saved here. Outputs also go to the args.store
+    SQLite file when it is set. With args.probe, devices whose probe output matches
+    args.probe_cache are skipped (run_job updates the cache). devices holds the entries of
+    a structured inventory (device type, port, credentials, commands per device). With
+    args.jump_host every device is reached through the bastion (the caller's, else one
+    opened and closed here) and the pre-flight sweep is skipped, the devices not being
+    reachable directly. Failed devices are put back in the queue as the retry policy
+    allows (the caller's, else one built from args for this run). With args.writer or
+    args.bundle the Outputs files are written by one OutputWriter thread for the run.
+    """
+    devices = devices or {}
+    owns_bastion = bastion is None and args.jump_host
+    if owns_bastion:
+        bastion = BastionPool(args.jump_host, *jump_credentials(args, username, password), args.jump_transports)
+    elif bastion is not None:
+        bastion.reset()  # A daemon job tries the jump host again after a failed one
+    results = []
+    if args.preflight and bastion is None:
+        ip_addresses, results = preflight(ip_addresses, args, devices)
+        if manifest is not None:
+            for result in results:
+                manifest.record(result)
+
+    owns_profiles = profiles is None
+    if owns_profiles and args.timing_profiles:
+        profiles = TimingProfiles(args.timing_profiles)
+    scheduler = AdaptiveScheduler(
+        ip_addresses,
+        args.concurrency,
+        initial=args.initial_concurrency,
+        sites=sites,
+        site_limits=site_limits,
+        adaptive=not args.fixed_concurrency,
+        durations=profiles.expected_durations(ip_addresses) if profiles is not None and args.longest_first else None,
+    )
+    if retries is None:
+        retries = RetryPolicy(args.retries, args.breaker_threshold, args.breaker_cooldown)
+    retries.forget(ip_addresses)
+    store = ResultStore(args.store, args.parse_templates) if args.store else None
+    probes = ProbeCache(args.probe_cache) if args.probe else None
+    writer = None
+    if (args.writer or args.bundle) and not args.archive:
+        writer = OutputWriter(args.output_dir, args.compress, args.fsync, args.bundle)
+    progress.start(len(ip_addresses), args.quiet)
+    try:
+        if args.engine == "asyncio":
+            return results + asyncio.run(
+                run_async_engine(
+                    ip_addresses,
+                    commands,
+                    username,
+                    password,
+                    args,
+                    scheduler,
+                    profiles,
+                    manifest,
+                    store,
+                    probes,
+                    devices,
+                    bastion,
+                    retries,
+                    writer,
+                )
+            )
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            while scheduler.pending() or running:
+                for ip_address, site in scheduler.ready():
+                    rejected = retries.rejected(ip_address)
+                    if rejected is not None:
+                        settle(rejected, site, scheduler, retries, results, manifest)
+                        continue
+                    future = executor.submit(
+                        execute_commands,
+                        ip_address,
+                        commands,
+                        username,
+                        password,
+                        args,
+                        pool,
+                        profiles,
+                        store,
+                        probes,
+                        devices.get(ip_address),
+                        bastion,
+                        writer,
+                    )
+                    running[future] = site
+                # Wake up for the next retry due even when no device finishes meanwhile
+                done, _ = wait(running, timeout=scheduler.next_due(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    settle(future.result(), running.pop(future), scheduler, retries, results, manifest)
+        return results
+    finally:
+        progress.stop()
+        if writer is not None:
+            writer.close()
+        if owns_bastion:
+            bastion.close()
+        if owns_profiles and profiles is not None:
+            profiles.save()
+        if store is not None:
+            store.close()
+        if manifest is not None:
+            manifest.save()
+
+
+class ResultForwarder:
+    """Manifest stand-in used inside shard processes: sends each result to the parent."""
+
+    def __init__(self, results_queue):
+        self.results_queue = results_queue
+
+    def record(self, result):
+        self.results_queue.put(result)
+
+    def save(self):
+        pass  # The parent process owns the manifest
+
+
+def split_shards(ip_addresses, count, sites=None, durations=None):
+    """Split the devices into count shards of similar load, keeping each site in one shard.
+
+    Site caps are enforced per process, so a site must not be spread over several shards.
+    The load of a device is its expected duration when durations are known, else 1, and
+    the heaviest groups are placed first so known-heavy devices end up in different shards.
+    """
+    sites = sites or {}
+    durations = durations or {}
+    groups = {}
+    for ip_address in ip_addresses:
+        site = sites.get(ip_address)
+        groups.setdefault(site if site is not None else ("device", ip_address), []).append(ip_address)
+
+    def load(group):
+        return sum(durations.get(ip_address, 1.0) for ip_address in group)
+
+    shards = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for group in sorted(groups.values(), key=load, reverse=True):
+        index = loads.index(min(loads))
+        shards[index].extend(group)
+        loads[index] += load(group)
+    return [shard for shard in shards if shard]
+
+
+def run_shard(shard, commands, username, password, args, sites, site_limits, results_queue, devices=None):
+    """Worker process entry point: run one shard with its own thread or asyncio pool.
+
+    Returns the results and the timing profiles learned for the shard's devices, which the
+    parent merges so that only one process writes the cache. Status events go to the
+    parent's renderer through the same queue as the results.
+    """
+    progress.forward = results_queue
+    profiles = TimingProfiles(args.timing_profiles) if args.timing_profiles else None
+    results = run_engine(
+        shard,
+        commands,
+        username,
+        password,
+        args,
+        sites,
+        site_limits,
+        manifest=ResultForwarder(results_queue),
+        profiles=profiles,
+        devices=devices,
+    )
+    learned = {}
+    if profiles is not None:
+        learned = {ip_address: profiles.devices[ip_address] for ip_address in shard if ip_address in profiles.devices}
+    return results, learned
+
+
+def run_sharded(
+    ip_addresses, commands, username, password, args, sites=None, site_limits=None, manifest=None, devices=None
+):
+    """Split the inventory over args.shards worker processes and merge their results."""
+    results = []
+    if args.preflight and not args.jump_host:
+        ip_addresses, results = preflight(ip_addresses, args, devices)
+        if manifest is not None:
+            for result in results:
+                manifest.record(result)
+
+    durations = None
+    if args.timing_profiles and args.longest_first:
+        durations = TimingProfiles(args.timing_profiles).expected_durations(ip_addresses)
+    shards = split_shards(ip_addresses, args.shards, sites, durations)
+    shard_args = copy.copy(args)
+    shard_args.preflight = False  # Already done once for the whole inventory
+    with multiprocessing.Manager() as manager:
+        results_queue = manager.Queue()
+        with ProcessPoolExecutor(max_workers=len(shards) or 1) as executor:
+            futures = [
+                executor.submit(
+                    run_shard,
+                    shard,
+                    commands,
+                    username,
+                    password,
+                    shard_args,
+                    sites,
+                    site_limits,
+                    results_queue,
+                    {ip_address: devices[ip_address] for ip_address in shard if ip_address in (devices or {})},
+                )
+                for shard in shards
+            ]
+            progress.start(len(ip_addresses), args.quiet)
+            try:
+                while True:
+                    try:
+                        item = results_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        if all(future.done() for future in futures):
+                            break
+                        continue
+                    if isinstance(item, tuple):
+                        progress.emit(*item[1:])
+                    elif manifest is not None:
+                        manifest.record(item)
+            finally:
+                progress.stop()
+
+            profiles = TimingProfiles(args.timing_profiles) if args.timing_profiles else None
+            for future in futures:
+                shard_results, learned = future.result()
+                results.extend(shard_results)
+                if profiles is not None:
+                    profiles.devices.update(learned)
+
+    if profiles is not None:
+        profiles.save()
+    if manifest is not None:
+        manifest.save()
+    print(
+        Fore.CYAN
+        + f"[INFO] {len(shards)} shards: {sum(r['status'] == 'done' for r in results)} devices done, "
+        f"{sum(r['status'] != 'done' for r in results)} failed"
+    )
+    return results
+
+
+class SessionPool:
+    """Keep authenticated netmiko sessions keyed by device so repeated jobs skip the login.
+
+    A session is handed to one worker at a time, checked with is_alive() before reuse and
+    disconnected once it has been idle for idle_timeout seconds.
+    """
+
+    def __init__(self, idle_timeout=600, check_interval=30):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        threading.Thread(target=self.reaper, args=(check_interval,), daemon=True).start()
+
+    @staticmethod
+    def key(device):
+        return device["host"], device.get("port", 22), device["username"]
+
+    def acquire(self, device, connect):
+        """Return a live pooled session for the device, or open a new one by calling connect()."""
+        with self.lock:
+            entry = self.sessions.pop(self.key(device), None)
+        if entry is not None:
+            ssh_conn = entry[0]
+            if ssh_conn.is_alive():
+                return ssh_conn
+            self.disconnect(ssh_conn)
+        return connect()
+
+    def release(self, device, ssh_conn):
+        """Give a session back to the pool once the worker is done with it."""
+        with self.lock:
+            self.sessions[self.key(device)] = (ssh_conn, time.monotonic())
+
+    @staticmethod
+    def disconnect(ssh_conn):
+        try:
+            ssh_conn.disconnect()
+        except Exception:
+            pass  # The session is already gone
+
+    def reaper(self, check_interval):
+        """Disconnect idle or dead sessions in the background."""
+        while not self.closed.wait(check_interval):
+            now = time.monotonic()
+            with self.lock:
+                expired = [
+                    key for key, (ssh_conn, last_used) in self.sessions.items()
+                    if now - last_used > self.idle_timeout
+                ]
+                stale = [self.sessions.pop(key)[0] for key in expired]
+                # Taken out of the pool so no worker can check one out while it is probed
+                idle = list(self.sessions.items())
+                self.sessions.clear()
+            live = []
+            for key, (ssh_conn, last_used) in idle:
+                if ssh_conn.is_alive():
+                    live.append((key, (ssh_conn, last_used)))
+                else:
+                    stale.append(ssh_conn)
+            with self.lock:
+                for key, entry in live:
+                    # A session released meanwhile for the same device is the fresher one
+                    if key in self.sessions:
+                        stale.append(entry[0])
+                    else:
+                        self.sessions[key] = entry
+            for ssh_conn in stale:
+                self.disconnect(ssh_conn)
+
+    def close(self):
+        """Stop the reaper and disconnect every pooled session."""
+        self.closed.set()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for ssh_conn, _ in sessions:
+            self.disconnect(ssh_conn)
+
+
+def daemon_address(args):
+    host, _, port = args.daemon_address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def daemon_authkey(create=False):
+    """Read the shared secret of the local daemon, creating it when starting the daemon."""
+    if create and not os.path.exists(DAEMON_KEY_FILE):
+        os.makedirs(os.path.dirname(DAEMON_KEY_FILE), exist_ok=True)
+        descriptor = os.open(DAEMON_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            file.write(secrets.token_hex(32))
+    with open(DAEMON_KEY_FILE, "r") as file:
+        return file.read().strip().encode()
+
+
+def serve_daemon(args):
+    """Run as a long-lived daemon keeping a pool of SSH sessions for the jobs it receives."""
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs("LOGs", exist_ok=True)
+    username, password = get_credentials(args)
+    pool = SessionPool(idle_timeout=args.idle_timeout)
+    args.engine = "threads"  # Only netmiko sessions can be pooled
+    # Pooled sessions ride on the bastion channels, so the bastion lives as long as the daemon
+    bastion = None
+    if args.jump_host:
+        bastion = BastionPool(args.jump_host, *jump_credentials(args, username, password), args.jump_transports)
+    # Open circuits carry over from one job to the next until their cooldown expires
+    retries = RetryPolicy(args.retries, args.breaker_threshold, args.breaker_cooldown)
+
+    listener = Listener(daemon_address(args), authkey=daemon_authkey(create=True))
+    print(Fore.CYAN + f"[INFO] Daemon listening on {args.daemon_address}, press Ctrl+C to stop")
+    try:
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                print(Fore.LIGHTRED_EX + f"[ERROR] Rejected daemon client: {e}")
+                continue
+            with connection:
+                # A bad job or a client gone meanwhile must not take the pooled sessions down
+                try:
+                    job = connection.recv()
+                    job_args = argparse.Namespace(**{**vars(args), **job.get("options", {})})
+                    results = run_engine(
+                        job["ip_addresses"],
+                        job["commands"],
+                        username,
+                        password,
+                        job_args,
+                        job["sites"],
+                        job["site_limits"],
+                        pool,
+                        devices=job.get("devices"),
+                        bastion=bastion,
+                        retries=retries,
+                    )
+                except Exception as e:
+                    print(Fore.LIGHTRED_EX + f"[ERROR] Daemon job failed: {e}")
+                    log_error(f"Daemon job failed: {e}", reason="daemon")
+                    with contextlib.suppress(Exception):
+                        connection.send({"error": str(e)})
+                    continue
+                with contextlib.suppress(EOFError, OSError):
+                    connection.send(results)
+    finally:
+        listener.close()
+        pool.close()
+        if bastion is not None:
+            bastion.close()
+
+
+def run_via_daemon(args, ip_addresses, commands, sites, site_limits, devices=None):
+    """Send a job and its job-level options to the running daemon and wait for its results."""
+    options = {name: getattr(args, name) for name in DAEMON_JOB_OPTIONS}
+    for name in DAEMON_JOB_PATHS:
+        if options[name]:
+            options[name] = os.path.abspath(options[name])
+    with Client(daemon_address(args), authkey=daemon_authkey()) as connection:
+        connection.send(
+            {
+                "ip_addresses": ip_addresses,
+                "commands": commands,
+                "sites": sites,
+                "site_limits": site_limits,
+                "devices": devices,
+                "options": options,
+            }
+        )
+        results = connection.recv()
+    if isinstance(results, dict):
+        raise RuntimeError(f"The daemon could not run the job: {results['error']}")
+    for result in results:
+        if result.get("unchanged"):
+            print(Fore.LIGHTCYAN_EX + f"[UNCHANGED] {result['ip']} : probe matches the last collection, skipped")
+        elif result["status"] == "done":
+            print(Fore.LIGHTGREEN_EX + f"[SUCCESS] {result['ip']} : Output saved ==> {result['filename']}")
+        else:
+            print(Fore.LIGHTRED_EX + "[ERROR]" + result["error"])
+    return results
+
+
+def read_commands(filename):
+    with open(filename, "r") as file:
+        return [cmd.strip() for cmd in file.readlines()]
+
+
+# Largest CIDR block or address range expanded from one inventory entry
+MAX_EXPANSION = 65536
+
+
+def expand_addresses(entry):
+    """Yield the addresses of an inventory entry lazily, in canonical form.
+
+    An entry is an address, a CIDR block (10.0.0.0/24, its hosts) or a range
+    (10.0.0.1-10.0.0.20, or 10.0.0.1-20 for the last IPv4 octet). Raises ValueError for
+    anything else and for blocks or ranges larger than MAX_EXPANSION addresses.
+    """
+    if "/" in entry:
+        network = ipaddress.ip_network(entry, strict=False)
+        if network.num_addresses > MAX_EXPANSION:
+            raise ValueError(f"{entry} has more than {MAX_EXPANSION} addresses")
+        yield from (str(address) for address in network.hosts())
+        return
+    if "-" in entry:
+        first, _, last = entry.partition("-")
+        first = ipaddress.ip_address(first)
+        if last.isdigit() and first.version == 4:
+            last = first.exploded.rsplit(".", 1)[0] + "." + last
+        last = ipaddress.ip_address(last)
+        if last.version != first.version or last < first:
+            raise ValueError(f"{entry} is not an address range")
+        if int(last) - int(first) >= MAX_EXPANSION:
+            raise ValueError(f"{entry} has more than {MAX_EXPANSION} addresses")
+        yield from (str(ipaddress.ip_address(value)) for value in range(int(first), int(last) + 1))
+        return
+    yield str(ipaddress.ip_address(entry))
+
+
+def address_key(ip_address):
+    address = ipaddress.ip_address(ip_address)
+    return address.version, int(address)
+
+
+def load_inventory(filename):
+    """Read the IP list and its optional site tags and per-site / per-subnet limits.
+
+    Each line holds an address, a CIDR block or a range (see expand_addresses) optionally
+    followed by a site name; blank lines and lines starting with # are skipped. Lines of
+    the form "limit <site or subnet> <n>" cap the number of devices of that site or subnet
+    in flight. Entries are expanded lazily, validated and deduplicated as the file is read
+    (the first site tag of an address wins) and the addresses are sorted, so junk never
+    reaches the scheduler. YAML and CSV inventories are read by load_structured_inventory.
+    Returns the addresses, their sites, the limits, the structured entries of the devices
+    (empty for a text list) and the invalid entries.
+    """
+    if filename.lower().endswith((".yaml", ".yml", ".csv")):
+        return load_structured_inventory(filename)
+    ip_addresses = []
+    tagged_sites = {}
+    site_limits = {}
+    invalid = []
+    seen = set()
+    with open(filename, "r") as file:
+        for line in file:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if len(fields) == 3 and fields[0].lower() == "limit":
+                try:
+                    site_limits[fields[1]] = parse_limit(fields[2])
+                except ValueError:
+                    invalid.append(" ".join(fields))
+                continue
+            try:
+                for ip_address in expand_addresses(fields[0]):
+                    if ip_address in seen:
+                        continue
+                    seen.add(ip_address)
+                    ip_addresses.append(ip_address)
+                    if len(fields) > 1:
+                        tagged_sites[ip_address] = fields[1]
+            except ValueError:
+                invalid.append(fields[0])
+    ip_addresses.sort(key=address_key)
+    return ip_addresses, assign_sites(ip_addresses, tagged_sites, site_limits), site_limits, {}, invalid
+
+
+def parse_limit(value):
+    """Cap of a limit entry, a whole number of at least 1; raises ValueError otherwise."""
+    limit = int(str(value).strip())
+    if limit < 1:
+        raise ValueError(f"limit {value} is below 1")
+    return limit
+
+
+def assign_sites(ip_addresses, tagged_sites, site_limits):
+    """Site of every device: its own tag, else the first limited subnet containing it."""
+    subnets = []
+    for key in site_limits:
+        try:
+            subnets.append((ipaddress.ip_network(key, strict=False), key))
+        except ValueError:
+            pass  # Not a subnet, the key is a site name
+
+    sites = {}
+    for ip_address in ip_addresses:
+        if ip_address in tagged_sites:
+            sites[ip_address] = tagged_sites[ip_address]
+        elif subnets and is_valid_ip(ip_address):
+            address = ipaddress.ip_address(ip_address)
+            for network, key in subnets:
+                if address.version == network.version and address in network:
+                    sites[ip_address] = key
+                    break
+    return sites
+
+
+def load_structured_inventory(filename):
+    """Read a YAML or CSV inventory giving each device its type, port, credentials and group.
+
+    YAML: a "devices" list (host, device_type, port, credentials, group, site), a "groups"
+    mapping whose entries give the commands of the group (a list or a file name) and
+    defaults for its devices, and an optional "limits" mapping (site or subnet -> n).
+    CSV: one device per row with the same columns, plus an optional "commands" column
+    naming the command file of the device. Devices without commands of their own run
+    commands.txt; command files are relative to the inventory. A host may be a CIDR block
+    or a range whose addresses share the row's settings; the first row of an address wins.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if filename.lower().endswith(".csv"):
+        with open(filename, "r", newline="") as file:
+            rows = list(csv.DictReader(file))
+        groups = {}
+        limits = {}
+    else:
+        import yaml
+
+        with open(filename, "r") as file:
+            data = yaml.safe_load(file) or {}
+        rows = data.get("devices") or []
+        groups = data.get("groups") or {}
+        limits = data.get("limits") or {}
+
+    command_files = {}
+
+    def commands_of(source):
+        if isinstance(source, list):
+            return [str(command).strip() for command in source]
+        path = os.path.join(directory, source)
+        if path not in command_files:
+            command_files[path] = read_commands(path)
+        return command_files[path]
+
+    ip_addresses = []
+    tagged_sites = {}
+    devices = {}
+    invalid = []
+    site_limits = {}
+    for key, value in limits.items():
+        try:
+            site_limits[str(key)] = parse_limit(value)
+        except ValueError:
+            invalid.append(f"limit {key} {value}")
+    for row in rows:
+        row = {key.strip(): value for key, value in row.items() if value not in (None, "")}
+        group = row.get("group")
+        entry = dict(groups.get(group) or {})
+        entry.update(row)
+        host = str(entry.get("host") or entry.get("ip") or "").strip()
+        try:
+            expanded = [ip_address for ip_address in expand_addresses(host) if ip_address not in devices]
+        except ValueError:
+            invalid.append(host)
+            continue
+        spec = {"device_type": entry.get("device_type", "nokia_sros")}
+        if entry.get("port"):
+            spec["port"] = int(entry["port"])
+        if entry.get("credentials"):
+            spec["credentials"] = str(entry["credentials"])
+        if group:
+            spec["group"] = str(group)
+        if entry.get("commands"):
+            spec["commands"] = commands_of(entry["commands"])
+        for ip_address in expanded:
+            ip_addresses.append(ip_address)
+            # One dict per device, resolve_device_credentials fills each in
+            devices[ip_address] = dict(spec)
+            if entry.get("site"):
+                tagged_sites[ip_address] = str(entry["site"])
+    ip_addresses.sort(key=address_key)
+    return ip_addresses, assign_sites(ip_addresses, tagged_sites, site_limits), site_limits, devices, invalid
+
+
+def resolve_device_credentials(devices, args):
+    """Fill in the username and password of the devices naming a credentials reference.
+
+    Interactive runs prompt for a reference missing from the environment; headless runs
+    never prompt and get a failure result for each device whose credentials are missing.
+    """
+    resolved = {}
+    failures = []
+    for ip_address, spec in devices.items():
+        reference = spec.get("credentials")
+        if not reference:
+            continue
+        if reference not in resolved:
+            resolved[reference] = credentials_from_environment(args, reference)
+            if resolved[reference] is None and not args.headless:
+                resolved[reference] = get_credentials(args, reference)
+        if resolved[reference] is None:
+            variable = "NDCE_" + re.sub(r"\W", "_", reference).upper()
+            failures.append(
+                report_failure(
+                    ip_address,
+                    "auth",
+                    f" No credentials '{reference}', set {variable}_USERNAME and {variable}_PASSWORD ==> {ip_address}",
+                )
+            )
+        else:
+            spec["username"], spec["password"] = resolved[reference]
+    return failures
+
+
+class ErrorLog:
+    """Thread-safe append-only JSON-lines error log rotated by size.
+
+    Every error costs one buffered append whatever the size of the log; once the file
+    exceeds max_bytes it is renamed to .1 (older files shift to .2, .3, ...).
+    """
+
+    def __init__(self, filename, max_bytes=5 * 1024 * 1024, backups=5):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                self.file = open(self.filename, "a", encoding="utf-8")
+            self.file.write(line)
+            self.file.flush()
+            if self.file.tell() >= self.max_bytes:
+                self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.filename}.{index}"):
+                os.replace(f"{self.filename}.{index}", f"{self.filename}.{index + 1}")
+        os.replace(self.filename, f"{self.filename}.1")
+        self.file = open(self.filename, "a", encoding="utf-8")
+
+    def newest_first(self):
+        """Yield the records from the newest to the oldest, across rotated files."""
+        for index in range(self.backups + 1):
+            filename = self.filename if index == 0 else f"{self.filename}.{index}"
+            if not os.path.exists(filename):
+                continue
+            for line in read_lines_backwards(filename):
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_lines_backwards(filename, block_size=65536):
+    """Yield the lines of a file from the last to the first, reading it in blocks."""
+    with open(filename, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            file.seek(position)
+            lines = (file.read(read_size) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                yield line.decode("utf-8")
+        if remainder:
+            yield remainder.decode("utf-8")
+
+
+error_log = ErrorLog(os.path.join("LOGs", "error_log.jsonl"))
+
+
+def log_error(error_msg, **fields):
+    """Append an error with its timestamp (and optional ip/reason fields) to the error log."""
+    record = {"time": datetime.now().isoformat(timespec="seconds"), "message": error_msg.strip()}
+    record.update(fields)
+    error_log.write(record)
+
+
+def show_errors(count):
+    """Print the latest errors, newest first."""
+    for index, record in enumerate(error_log.newest_first()):
+        if index >= count:
+            break
+        details = " ".join(f"{key}={value}" for key, value in record.items() if key not in ("time", "message"))
+        print(f"{record['time']}: {record['message']}" + (f"  ({details})" if details else ""))
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (fraction between 0 and 1)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def write_run_report(results, directory):
+    """Export the per-device phase and command timings as JSON and CSV, return the file names."""
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"run_{time.strftime('%Y-%m-%d_%H-%M-%S')}")
+    with open(stem + ".json", "w") as file:
+        json.dump(results, file, indent=1)
+    with open(stem + ".csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["ip", "host", "status", "phase", "command", "seconds"])
+        for result in results:
+            timings = result.get("timings")
+            if not timings:
+                writer.writerow([result["ip"], "", result["status"], "", "", ""])
+                continue
+            for phase, seconds in timings["phases"].items():
+                writer.writerow([result["ip"], result.get("host", ""), result["status"], phase, "", f"{seconds:.4f}"])
+            for command, seconds in timings["commands"]:
+                writer.writerow([result["ip"], result.get("host", ""), result["status"], "command", command, f"{seconds:.4f}"])
+    return stem + ".json", stem + ".csv"
+
+
+def print_run_summary(results, top=5):
+    """Print p50/p95/p99 per phase and the slowest devices and commands of a run."""
+    timed = [result for result in results if result.get("timings")]
+    phases = {}
+    commands = []
+    for result in timed:
+        for phase, seconds in result["timings"]["phases"].items():
+            phases.setdefault(phase, []).append(seconds)
+        commands.extend((seconds, result["ip"], command) for command, seconds in result["timings"]["commands"])
+
+    print(f"{'phase':<20}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>10}")
+    for phase, values in phases.items():
+        print(
+            f"{phase:<20}{percentile(values, 0.5):>9.3f}{percentile(values, 0.95):>9.3f}"
+            f"{percentile(values, 0.99):>9.3f}{sum(values):>10.1f}"
+        )
+    print("Slowest devices:")
+    for result in sorted(timed, key=lambda result: result["elapsed"], reverse=True)[:top]:
+        print(f"  {result['elapsed']:8.2f}s  {result.get('host', '')} ({result['ip']})")
+    print("Slowest commands:")
+    for seconds, ip_address, command in sorted(commands, reverse=True)[:top]:
+        print(f"  {seconds:8.2f}s  {ip_address}  {command}")
+
+
+def run_job(args, username=None, password=None):
+    """Load the inventory and commands, run them (or resume the last job) and return the results."""
+    ip_addresses, sites, site_limits, devices, invalid = load_inventory(args.inventory)
+    commands = read_commands(args.commands)
+
+    if args.resume and os.path.exists(args.job_file):
+        manifest = JobManifest.load(args.job_file)
+        ip_addresses = manifest.remaining()
+        commands = manifest.commands
+        print(Fore.CYAN + f"[INFO] Resuming {args.job_file}: {len(ip_addresses)} devices left to run")
+    else:
+        manifest = JobManifest.create(args.job_file, ip_addresses, commands)
+    # Invalid entries are reported once here, they never take a worker nor a manifest entry
+    rejected = [] if args.resume else [
+        report_failure(entry, "invalid", f" Invalid inventory entry: {entry}") for entry in invalid
+    ]
+
+    # Every group of a mixed inventory runs in the same pool, credentials are resolved once up front
+    failures = resolve_device_credentials({ip: devices[ip] for ip in ip_addresses if ip in devices}, args)
+    for result in failures:
+        manifest.record(result)
+    missing = {result["ip"] for result in failures}
+    ip_addresses = [ip_address for ip_address in ip_addresses if ip_address not in missing]
+    failures = rejected + failures
+
+    if args.use_daemon:
+        results = failures + run_via_daemon(args, ip_addresses, commands, sites, site_limits, devices)
+        for result in results:
+            manifest.record(result)
+        manifest.save()
+    elif args.shards > 1:
+        results = failures + run_sharded(
+            ip_addresses, commands, username, password, args, sites, site_limits, manifest, devices
+        )
+    else:
+        results = failures + run_engine(
+            ip_addresses, commands, username, password, args, sites, site_limits, manifest=manifest, devices=devices
+        )
+    if args.probe:
+        probes = ProbeCache(args.probe_cache)
+        probes.update(results, args.probe)
+        probes.save()
+        unchanged = sum(1 for result in results if result.get("unchanged"))
+        print(Fore.CYAN + f"[INFO] {unchanged} unchanged devices skipped, {len(results) - unchanged} collected or failed")
+    if args.archive:
+        archive = OutputArchive(args.archive)
+        previous = archive.runs()
+        run = archive.save_run(results, previous[-1] if previous else None)
+        print(Fore.CYAN + f"[INFO] Outputs archived as run {run} in {args.archive}")
+        if previous:
+            report_archive_diff(archive, previous[-1], run)
+    if args.report:
+        json_file, csv_file = write_run_report(results, args.report_dir)
+        print_run_summary(results)
+        print(Fore.CYAN + f"[INFO] Timing report saved ==> {json_file}, {csv_file}")
+    return results
+
+
+def main(args=None):
+    """Main function to execute the SSH commands."""
+    if args is None:
+        args = parse_args([])
+    start_time = datetime.now()
+    current_date_time = time.strftime("%Y-%m-%d %H-%M-%S")
+    print(Fore.LIGHTBLUE_EX + f"Current date and time : {current_date_time}")
+    print(20 * "#", "Event Log", 20 * "#")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs("LOGs", exist_ok=True)
+
+    if not check_files_exist((args.inventory, args.commands)):
+        print(
+            Fore.LIGHTRED_EX
+            + f"\r[ERROR] Please make sure '{args.inventory}' and '{args.commands}' are available.\n\n"
+        )
+        return
+
+    username = password = None
+    if not args.use_daemon:
+        username, password = get_credentials(args)
+
+    print(
+        Fore.CYAN
+        + f"[INFO] All required files '{args.inventory}' and '{args.commands}' are available."
+    )
+
+    run_job(args, username, password)
+
+    end_time = datetime.now()
+    print(Fore.CYAN + f"[INFO] Elapsed Time: {end_time - start_time} Min\n")
+
+    want_save = input(
+        f"\n{Fore.YELLOW}Do you want to open the {args.output_dir} folder? (y/n): "
+        + Style.RESET_ALL
+    )
+    if want_save.lower() == "y":
+        open_file(args.output_dir)
+
+    input(Fore.MAGENTA + "Press Enter to continue..." + Style.RESET_ALL)
+
+
+def run_headless(args):
+    """Run one job without any prompt and return the process exit code."""
+    if not check_files_exist((args.inventory, args.commands)):
+        return EXIT_USAGE
+
+    username = password = None
+    if not args.use_daemon:
+        credentials = credentials_from_environment(args)
+        if credentials is None:
+            print(
+                "Missing credentials: set --username or NDCE_USERNAME, and NDCE_PASSWORD or --keyring-service",
+                file=sys.stderr,
+            )
+            return EXIT_USAGE
+        username, password = credentials
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs("LOGs", exist_ok=True)
+    start_time = time.monotonic()
+    results = run_job(args, username, password)
+
+    failed = sum(1 for result in results if result["status"] != "done")
+    print(
+        Fore.CYAN
+        + f"[INFO] {len(results) - failed} devices done, {failed} failed in {time.monotonic() - start_time:.1f}s"
+    )
+    if not failed:
+        return EXIT_OK
+    if failed == len(results):
+        return EXIT_ALL_FAILED
+    return EXIT_DEVICE_FAILURES
+
+
+def archive_command(args):
+    """Handle --archive-diff and --archive-export, return the exit code."""
+    archive = OutputArchive(args.archive or "Archive")
+    runs = archive.runs()
+    if args.archive_export:
+        if args.archive_export not in runs:
+            print(f"Unknown run {args.archive_export}, archived runs: {', '.join(runs) or 'none'}", file=sys.stderr)
+            return EXIT_USAGE
+        count = archive.export(args.archive_export, args.output_dir)
+        print(Fore.CYAN + f"[INFO] {count} device outputs of run {args.archive_export} written to {args.output_dir}")
+        return EXIT_OK
+    selected = args.archive_diff or runs[-2:]
+    if len(selected) != 2 or not set(selected) <= set(runs):
+        print(f"Need two archived runs to compare, archived runs: {', '.join(runs) or 'none'}", file=sys.stderr)
+        return EXIT_USAGE
+    report_archive_diff(archive, *selected)
+    return EXIT_OK
+
+
+def cli(argv=None):
+    """Console entry point: dispatch to the menu, the daemon or a headless run and return the exit code."""
+    args = parse_args(argv)
+    if args.show_errors is not None:
+        show_errors(args.show_errors)
+        return EXIT_OK
+    if args.archive_diff is not None or args.archive_export:
+        return archive_command(args)
+    if args.headless:
+        LazyColor.enabled = sys.stdout.isatty() and not args.quiet
+        try:
+            if args.quiet:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    return run_headless(args)
+            return run_headless(args)
+        except KeyboardInterrupt:
+            print("Interrupted, run again with --resume to finish the job", file=sys.stderr)
+            return EXIT_INTERRUPTED
+        except Exception as e:
+            # Not the device failures of EXIT_DEVICE_FAILURES: the job itself could not run
+            print(f"Unexpected error: {e}", file=sys.stderr)
+            log_error(f"Unexpected error: {e}", reason="headless")
+            return EXIT_ERROR
+
+    try:
+        if args.daemon:
+            serve_daemon(args)
+        else:
+            main_menu(args)
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}Program interrupted by user. Exiting...{Style.RESET_ALL}")
         time.sleep(2)
-        sys.exit(0)
+        return EXIT_OK
     except Exception as e:
         print(f"\n{Fore.RED}An unexpected error occurred: {e}{Style.RESET_ALL}")
         log_error(f"Unexpected error: {e}")
         time.sleep(5)
-        sys.exit(1)
+        return 1
     except BaseException as be:
         # This block will catch `KeyboardInterrupt` if it hasn't been caught earlier
         print(f"\n{Fore.YELLOW}Caught BaseException (likely KeyboardInterrupt). Exiting...{Style.RESET_ALL}")
         time.sleep(2)
-        sys.exit(0)
+        return EXIT_OK
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,259 @@
+import io
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import device_addresses, load_script  # noqa: E402
+from mock_sros_server import start_server  # noqa: E402
+
+tool = load_script()
+tool.LazyColor.enabled = False
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run every test in its own directory, the tool writes LOGs and Outputs relative to it."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("LOGs")
+    os.makedirs("Outputs")
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def mock_port():
+    server = start_server(0)
+    yield server.getsockname()[1]
+    server.close()
+
+
+def test_split_batch_output():
+    commands = ["show version", "show bof"]
+    buffer = (
+        "show version\nTiMOS-B-20.10.R1\nA:R1# echo \"MARK0\"\nMARK0\n"
+        "A:R1# show bof\nBOF (Memory)\nprimary-image cf3:\\timos\nA:R1# echo \"MARK1\"\nMARK1\n"
+    )
+    assert tool.split_batch_output(buffer, commands, "MARK") == [
+        "TiMOS-B-20.10.R1",
+        "BOF (Memory)\nprimary-image cf3:\\timos",
+    ]
+
+
+def test_split_batch_output_empty_output():
+    buffer = "show card\nA:R1# echo \"MARK0\"\nMARK0\n"
+    assert tool.split_batch_output(buffer, ["show card"], "MARK") == [""]
+
+
+def test_output_streamer_drops_echo_and_prompt():
+    file = io.StringIO()
+    streamer = tool.OutputStreamer(file, "A:R1#")
+    assert not streamer.feed("show ver")
+    assert not streamer.feed("sion\r\nline 1\r\nli")
+    assert not streamer.feed("ne 2\r\nA:R1")
+    assert streamer.feed("# ")
+    assert file.getvalue() == "line 1\nline 2"
+
+
+def test_output_streamer_large_output():
+    lines = [f"10.0.{index // 256}.{index % 256}/32 Remote BGP" for index in range(500)]
+    data = "show router route-table\r\n" + "\r\n".join(lines) + "\r\n*A:R1# "
+    file = io.StringIO()
+    streamer = tool.OutputStreamer(file, "*A:R1#")
+    finished = [streamer.feed(data[index:index + 100]) for index in range(0, len(data), 100)]
+    assert finished[-1] and not any(finished[:-1])
+    assert file.getvalue() == "\n".join(lines)
+
+
+@pytest.mark.parametrize(
+    "entry, expected",
+    [
+        ("10.0.0.1", ["10.0.0.1"]),
+        ("10.0.0.0/30", ["10.0.0.1", "10.0.0.2"]),
+        ("10.0.0.1-3", ["10.0.0.1", "10.0.0.2", "10.0.0.3"]),
+        ("10.0.0.254-10.0.1.1", ["10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"]),
+        ("2001:DB8::1", ["2001:db8::1"]),
+    ],
+)
+def test_expand_addresses(entry, expected):
+    assert list(tool.expand_addresses(entry)) == expected
+
+
+@pytest.mark.parametrize("entry", ["router1", "10.0.0.300", "10.0.0.5-2", "10.0.0.1-2001:db8::1", "10.0.0.0/8"])
+def test_expand_addresses_rejects(entry):
+    with pytest.raises(ValueError):
+        list(tool.expand_addresses(entry))
+
+
+def test_retry_policy_backoff_until_exhausted():
+    policy = tool.RetryPolicy(max_retries=3, breaker_threshold=10)
+    delays = [policy.retry_delay({"ip": "10.0.0.1", "status": "failed", "reason": "timeout"}) for _ in range(4)]
+    assert delays[-1] is None
+    for attempt, delay in enumerate(delays[:-1], 1):
+        assert 0 <= delay <= 2.0 * 2 ** (attempt - 1)
+
+
+def test_retry_policy_final_reasons():
+    policy = tool.RetryPolicy()
+    for reason in ("auth", "invalid", "jump_host", "write"):
+        assert policy.retry_delay({"ip": "10.0.0.1", "status": "failed", "reason": reason}) is None
+    assert policy.retry_delay({"ip": "10.0.0.2", "status": "done"}) is None
+
+
+def test_retry_policy_circuit_breaker():
+    policy = tool.RetryPolicy(max_retries=5, breaker_threshold=2, breaker_cooldown=300)
+    failure = {"ip": "10.0.0.1", "status": "failed", "reason": "ssh"}
+    # The two retries of an SSH error are spent before the circuit opens
+    assert policy.retry_delay(dict(failure)) is not None
+    assert policy.retry_delay(dict(failure)) is not None
+    assert policy.rejected("10.0.0.1") is None
+    assert policy.retry_delay(dict(failure)) is None
+    assert policy.rejected("10.0.0.1")["reason"] == "circuit_open"
+    assert policy.rejected("10.0.0.2") is None
+
+    # A failed trial after the cooldown reopens the circuit without retries
+    policy.breaker_cooldown = 0
+    policy.forget(["10.0.0.1"])
+    assert policy.rejected("10.0.0.1") is None
+    assert policy.retry_delay(dict(failure)) is None
+    policy.breaker_cooldown = 300
+    assert policy.rejected("10.0.0.1")["reason"] == "circuit_open"
+
+    policy.retry_delay({"ip": "10.0.0.1", "status": "done"})
+    assert policy.rejected("10.0.0.1") is None
+
+
+def test_retry_policy_defaults_spend_every_retry():
+    policy = tool.RetryPolicy()
+    failure = {"ip": "10.0.0.1", "status": "failed", "reason": "timeout"}
+    delays = [policy.retry_delay(dict(failure)) for _ in range(4)]
+    assert [delay is not None for delay in delays] == [True, True, True, False]
+
+
+def test_scheduler_site_caps():
+    ip_addresses = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.1.1"]
+    sites = {"10.0.0.1": "a", "10.0.0.2": "a", "10.0.0.3": "a", "10.0.1.1": "b"}
+    scheduler = tool.AdaptiveScheduler(ip_addresses, 10, sites=sites, site_limits={"a": 2}, adaptive=False)
+    started = scheduler.ready()
+    assert sorted(started) == [("10.0.0.1", "a"), ("10.0.0.2", "a"), ("10.0.1.1", "b")]
+    assert scheduler.ready() == []
+    scheduler.finished("a", {"ip": "10.0.0.1", "status": "done"})
+    assert scheduler.ready() == [("10.0.0.3", "a")]
+    assert not scheduler.pending()
+
+
+def test_scheduler_longest_first():
+    durations = {"10.0.0.1": 5.0, "10.0.0.2": 60.0, "10.0.0.3": 20.0}
+    scheduler = tool.AdaptiveScheduler(list(durations), 1, adaptive=False, durations=durations)
+    order = []
+    while scheduler.pending():
+        [(ip_address, site)] = scheduler.ready()
+        order.append(ip_address)
+        scheduler.finished(site, {"ip": ip_address, "status": "done"})
+    assert order == ["10.0.0.2", "10.0.0.3", "10.0.0.1"]
+
+
+def test_scheduler_requeue_waits_for_delay():
+    scheduler = tool.AdaptiveScheduler(["10.0.0.1"], 4, adaptive=False)
+    [(ip_address, site)] = scheduler.ready()
+    scheduler.finished(site, {"ip": ip_address, "status": "failed", "reason": "timeout"})
+    scheduler.requeue(ip_address, site, 0.05)
+    assert scheduler.pending() and scheduler.ready() == []
+    assert 0 < scheduler.next_due() <= 0.05
+    time.sleep(0.06)
+    assert scheduler.ready() == [("10.0.0.1", None)]
+    assert scheduler.next_due() is None
+
+
+def test_scheduler_adapts_limit():
+    scheduler = tool.AdaptiveScheduler(device_addresses(20), 10, initial=4)
+    handshake = {"phases": {"ssh_handshake_auth": 0.1}}
+    for ip_address, site in scheduler.ready():
+        scheduler.finished(site, {"ip": ip_address, "status": "done", "timings": handshake})
+    assert scheduler.limit == 8
+    # A pooled session has no handshake and must not become the best connect time
+    [(ip_address, site)] = scheduler.ready()[:1]
+    scheduler.finished(site, {"ip": ip_address, "status": "done", "timings": {"phases": {"pool_checkout": 0.001}}})
+    assert scheduler.best_connect == 0.1
+    scheduler.finished(None, {"ip": "127.0.0.9", "status": "failed", "reason": "timeout"})
+    assert scheduler.limit == 4
+
+
+def test_split_shards_keeps_sites_together():
+    ip_addresses = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.5"]
+    sites = {"10.0.0.1": "a", "10.0.0.2": "a", "10.0.0.3": "a"}
+    shards = tool.split_shards(ip_addresses, 2, sites)
+    assert sorted(ip_address for shard in shards for ip_address in shard) == ip_addresses
+    assert any({"10.0.0.1", "10.0.0.2", "10.0.0.3"} <= set(shard) for shard in shards)
+    assert sorted(len(shard) for shard in shards) == [2, 3]
+
+
+def test_split_shards_balances_durations():
+    durations = {"10.0.0.1": 100.0, "10.0.0.2": 90.0, "10.0.0.3": 10.0, "10.0.0.4": 5.0}
+    shards = tool.split_shards(list(durations), 2, durations=durations)
+    assert sorted(sorted(shard) for shard in shards) == [["10.0.0.1", "10.0.0.4"], ["10.0.0.2", "10.0.0.3"]]
+    assert tool.split_shards(["10.0.0.1"], 4) == [["10.0.0.1"]]
+
+
+@pytest.mark.parametrize(
+    "fraction, expected", [(0.0, 1), (0.5, 5), (0.9, 9), (0.95, 10), (0.99, 10), (1.0, 10)]
+)
+def test_percentile(fraction, expected):
+    assert tool.percentile(list(range(10, 0, -1)), fraction) == expected
+
+
+def test_percentile_empty():
+    assert tool.percentile([], 0.5) == 0.0
+
+
+def test_output_writer_writes_files(workdir):
+    writer = tool.OutputWriter("Outputs", buffer_size=8)
+    file, filename = writer.open(os.path.join("Outputs", "R1.txt"))
+    with file:
+        file.write("show version\n")
+        file.write("TiMOS\n")
+    file.wait()
+    writer.close()
+    with open(filename) as output:
+        assert output.read() == "show version\nTiMOS\n"
+
+
+def test_output_writer_failure_marks_file_and_keeps_running(workdir):
+    writer = tool.OutputWriter("Outputs", buffer_size=8)
+    broken, _ = writer.open(os.path.join("missing", "R1.txt"))
+    # The first flush fails, the records queued after it belong to a dropped file
+    broken.write("more than eight bytes\n")
+    broken.write("orphaned record\n")
+    broken.close()
+    with pytest.raises(tool.OutputWriteError):
+        broken.wait()
+
+    file, filename = writer.open(os.path.join("Outputs", "R2.txt"))
+    with file:
+        file.write("still written\n")
+    file.wait()
+    writer.close()
+    assert not writer.thread.is_alive()
+    with open(filename) as output:
+        assert output.read() == "still written\n"
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_engine_against_mock_server(engine, mock_port, workdir):
+    commands = ["show bof", "show version"]
+    args = tool.parse_args(
+        ["--engine", engine, "--port", str(mock_port), "--concurrency", "2", "--fixed-concurrency",
+         "--no-timing-profiles"]
+    )
+    results = tool.run_engine(device_addresses(2), commands, "admin", "admin", args)
+
+    assert sorted(result["ip"] for result in results) == ["127.0.0.1", "127.0.0.2"]
+    for result in results:
+        assert result["status"] == "done", result
+        assert result["host"] == "R" + result["ip"].rsplit(".", 1)[1]
+        with open(result["filename"]) as output:
+            content = output.read()
+        assert "BOF (Memory)" in content
+        assert "not supported by mock router: show version" in content